@@ -4,9 +4,7 @@ import queue
 import numpy as np
 import csv
 import cv2
-import cv2.aruco as aruco  # Добавлен импорт для ArUco
 from datetime import datetime
-from pyzbar import pyzbar
 from pion.pion import Pion  # Для БВС (Scout и Transport)
 from rzd import *  # Для видеопотока дронов
 from omegabot_poligon77 import Robot  # Для РТС
@@ -30,6 +28,11 @@ WOOD_DEST = (3.5, -0.24)
 RAILWAY_START = (-5, 5, 0.03)
 RAILWAY_END = (5, -5, 0.03)
 WAGON_POS = (0, 0, 0.2)
+# Сторона ArUco-метки, м: если задана, положение метки считается через solvePnP (задать по реальной метке)
+ARUCO_MARKER_SIZE = None
+# Длина стороны QR-кода (м) по префиксу данных груза, например {"Box": 0.2, "Stone": 0.2, "Wood": 0.2}.
+# Если задана, дальность до кода оценивается по его видимому размеру (задать по реальным кодам)
+QR_EDGE_LENGTHS = None
 
 def is_near_railway(x, y):
     distance = abs(-x + y - 5) / np.sqrt(2)
@@ -98,16 +101,29 @@ class ScoutDrone:
         self.drone = Pion(ip=drone_info["ip"], mavlink_port=drone_info["mavlink_port"])
         self.start_pos = drone_info["start_pos"]
         self.camera = SocketCamera(ip=drone_info["ip"], port=drone_info["camera_port"])
+        # Единственный читатель камеры: детектор и отображение получают одни и те же кадры
+        self.frame_bus = FrameBus(self.camera, name=f"ScoutDrone {self.id}")
+        self.detector_frames = self.frame_bus.subscribe("detector")
+        self.display_frames = self.frame_bus.subscribe("display")
+        self.frame_bus.start()
+        # Телеметрия пишется с высокой частотой, чтобы брать позу на момент захвата кадра
+        self.telemetry = TelemetryRecorder(self.drone)
+        self.telemetry.start()
+        self.max_frame_age = 0.5  # Кадры старше этого (с) не используются для локализации
         self.frame_center = (320, 240)
+        self.camera_intrinsics = camera_intrinsics(self.frame_center)
         self.qr_found = set()
         self.running = True
-        self.aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_4X4_50)  # Словарь ArUco
-        self.aruco_params = aruco.DetectorParameters()  # Параметры детектора ArUco
-        self.aruco_detector = aruco.ArucoDetector(self.aruco_dict, self.aruco_params)
+        # Поиск QR-кодов и ArUco-меток. Пропуск неизменившейся сцены (SceneChangeGate) не включён:
+        # дрон в полёте. Смазанные в полёте кадры пропускаются (SharpnessGate), а кадр в точке облёта
+        # декодируется в любом случае (detect_qr(force=True))
+        self.marker_detector = MarkerDetector(parallel=True, prefilter=CandidatePrefilter(),
+                                              blur_gate=SharpnessGate())
         print(f"Scout {self.id}: Инициализация камеры на {drone_info['ip']}:{drone_info['camera_port']}")
         if not self.check_camera_connection():
             print(f"Scout {self.id}: Не удалось подключиться к камере, завершаю инициализацию")
             self.running = False
+            self.frame_bus.stop()
             return
         self.video_thread = threading.Thread(target=self.show_video_stream)
         self.video_thread.start()
@@ -116,7 +132,7 @@ class ScoutDrone:
         max_attempts = 10
         for attempt in range(max_attempts):
             try:
-                frame = self.camera.get_cv_frame()
+                frame = self.detector_frames.get(timeout=2)
                 if frame is not None:
                     print(f"Scout {self.id}: Камера подключена успешно (попытка {attempt + 1}/{max_attempts})")
                     return True
@@ -136,35 +152,36 @@ class ScoutDrone:
         except Exception as e:
             print(f"Scout {self.id}: Ошибка при взлете: {e}")
 
-    def detect_qr(self):
+    def detect_qr(self, force=False):
         try:
-            frame = self.camera.get_cv_frame()
+            packet = self.detector_frames.get(timeout=self.camera.timeout)
+            frame = packet.image if packet is not None else None
             if frame is None:
                 print(f"Scout {self.id}: Не удалось получить кадр")
                 return None
+            if time.time() - packet.timestamp > self.max_frame_age:
+                print(f"Scout {self.id}: Кадр устарел, пропускаю")
+                return None
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # Обнаружение QR-кодов
-            qr_codes = pyzbar.decode(gray)
-            if qr_codes:
-                qr_code = qr_codes[0]
-                data = qr_code.data.decode("utf-8")
-                process_qr_code(self.id, data)
-                points = np.array(qr_code.polygon)
-                coords = self.calculate_coords(points)
-                detect_object(self.drone, data)
-                return {"key": data, "coords": coords}
-
-            # Обнаружение ArUco-меток
-            corners, ids, _ = self.aruco_detector.detectMarkers(frame)
-            if ids is not None:
-                marker_id = ids[0][0]
-                process_aruco_marker(self.id, marker_id)
-                points = np.array(corners[0])
-                coords = self.calculate_coords(points)
-                detect_object(self.drone, f"ArUco_{marker_id}")
-                return {"key": f"ArUco_{marker_id}", "coords": coords}
+            # QR-коды идут в списке раньше ArUco-меток, поэтому приоритет у QR
+            detections = self.marker_detector.detect(frame, packet.seq, force=force)
+            if detections:
+                detection = detections[0]
+                if detection.kind == KIND_QR:
+                    process_qr_code(self.id, detection.data)
+                else:
+                    process_aruco_marker(self.id, detection.data)
+                # Положение ArUco-меток и QR-кодов известного размера по их вершинам, без высоты из телеметрии
+                poses = {}
+                if ARUCO_MARKER_SIZE is not None:
+                    poses = estimate_marker_poses(detections, ARUCO_MARKER_SIZE, self.camera_intrinsics)
+                if QR_EDGE_LENGTHS is not None:
+                    poses.update(estimate_qr_poses(to_gray(frame), detections, self.camera_intrinsics,
+                                                   QR_EDGE_LENGTHS))
+                coords = self.calculate_coords(detection.corners, packet.timestamp, poses.get(detection.key),
+                                               fuse=detection.kind == KIND_QR)
+                detect_object(self.drone, detection.key)
+                return {"key": detection.key, "coords": coords}
 
             print(f"Scout {self.id}: Ни QR-код, ни ArUco-метка не обнаружены")
             return None
@@ -172,43 +189,35 @@ class ScoutDrone:
             print(f"Scout {self.id}: Ошибка с камерой: {e}")
             return None
 
-    def calculate_coords(self, points):
-        pos = self.drone.position[:3] if self.drone.position is not None else [0, 0, 0]
-        center = np.mean(points, axis=0)
-        shift_x_px = center[0] - self.frame_center[0]
-        shift_y_px = center[1] - self.frame_center[1]
-        shift_x_m = (shift_x_px * pos[2]) / 700
-        shift_y_m = (shift_y_px * pos[2]) / 700
+    def calculate_coords(self, points, timestamp=None, pose=None, fuse=False):
+        # Поза дрона на момент захвата кадра, если она есть в записи телеметрии
+        drone_pose = self.telemetry.pose_at(timestamp) if timestamp is not None else None
+        if drone_pose is not None:
+            pos = drone_pose[:3]
+        else:
+            pos = self.drone.position[:3] if self.drone.position is not None else [0, 0, 0]
+        if pose is not None:
+            if fuse:
+                # Дальность по размеру QR-кода уточняется высотой из телеметрии
+                pose = fuse_pose_with_altitude(pose, pos[2])
+            shift_x_m, shift_y_m = pose.tvec[0], pose.tvec[1]
+        else:
+            center = np.mean(points, axis=0)
+            shift_x_px = center[0] - self.frame_center[0]
+            shift_y_px = center[1] - self.frame_center[1]
+            shift_x_m = (shift_x_px * pos[2]) / 700
+            shift_y_m = (shift_y_px * pos[2]) / 700
         return [pos[0] + shift_x_m, pos[1] + shift_y_m, pos[2]]
 
     def show_video_stream(self):
         while self.running:
             try:
-                frame = self.camera.get_cv_frame()
+                packet = self.display_frames.get(timeout=self.camera.timeout)
+                frame = packet.image if packet is not None else None
                 if frame is not None:
-                    display_frame = frame.copy()
-                    gray = cv2.cvtColor(display_frame, cv2.COLOR_BGR2GRAY)
-
-                    # Отрисовка QR-кодов
-                    qr_codes = pyzbar.decode(gray)
-                    for qr_code in qr_codes:
-                        data = qr_code.data.decode("utf-8")
-                        (x, y, w, h) = qr_code.rect
-                        cv2.rectangle(display_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                        cv2.putText(display_frame, data, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                    # Отрисовка ArUco-меток
-                    corners, ids, _ = self.aruco_detector.detectMarkers(display_frame)
-                    if ids is not None:
-                        for i in range(len(ids)):
-                            marker_corners = corners[i][0]
-                            for j in range(4):
-                                start_point = tuple(map(int, marker_corners[j]))
-                                end_point = tuple(map(int, marker_corners[(j + 1) % 4]))
-                                cv2.line(display_frame, start_point, end_point, (0, 255, 0), 2)
-                            marker_id = ids[i][0]
-                            cv2.putText(display_frame, str(marker_id), tuple(map(int, marker_corners[0])),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+                    # Для кадра, уже обработанного detect_qr, берётся готовый результат
+                    detections = self.marker_detector.detect(frame, packet.seq)
+                    display_frame = draw_detections(frame.copy(), detections)
 
                     cv2.imshow(f"Scout {self.id} Stream", display_frame)
                     if cv2.waitKey(1) == 27:
@@ -216,6 +225,9 @@ class ScoutDrone:
             except Exception as e:
                 print(f"Scout {self.id}: Ошибка с видеопотоком: {e}")
             time.sleep(0.1)
+        self.frame_bus.stop()
+        print(f"Scout {self.id}: фильтр кандидатов детектора меток {self.marker_detector.prefilter.stats()}, "
+              f"смазанные кадры {self.marker_detector.blur_gate.stats()}")
 
     def scout_mission(self):
         if not self.running:
@@ -257,7 +269,8 @@ class ScoutDrone:
                             self.return_to_start()
                             return
                     time.sleep(0.5)
-                code_info = self.detect_qr()
+                # В точке облёта одна попытка: кадр декодируется, даже если фильтры его отклонили
+                code_info = self.detect_qr(force=True)
                 if code_info:
                     code_key = code_info["key"]
                     if code_key in ["Box 2 1", "Box 2 2", "Box 1 1", "Box 1 2", "Stone_1", "Wood_1", "Stone_2",
@@ -291,15 +304,24 @@ class TransportDrone:
         self.drone = Pion(ip=drone_info["ip"], mavlink_port=drone_info["mavlink_port"])
         self.start_pos = drone_info["start_pos"]
         self.camera = SocketCamera(ip=drone_info["ip"], port=drone_info["camera_port"])
+        # Единственный читатель камеры: детектор и отображение получают одни и те же кадры
+        self.frame_bus = FrameBus(self.camera, name=f"TransportDrone {self.id}")
+        self.detector_frames = self.frame_bus.subscribe("detector")
+        self.display_frames = self.frame_bus.subscribe("display")
+        self.frame_bus.start()
+        # Телеметрия пишется с высокой частотой, чтобы брать позу на момент захвата кадра
+        self.telemetry = TelemetryRecorder(self.drone)
+        self.telemetry.start()
+        self.max_frame_age = 0.5  # Кадры старше этого (с) не используются для локализации
         self.frame_center = (320, 240)
+        self.camera_intrinsics = camera_intrinsics(self.frame_center)
         self.running = True
-        self.aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_4X4_50)
-        self.aruco_params = aruco.DetectorParameters()
-        self.aruco_detector = aruco.ArucoDetector(self.aruco_dict, self.aruco_params)
+        self.marker_detector = MarkerDetector(parallel=True, prefilter=CandidatePrefilter())
         print(f"Transport {self.id}: Инициализация камеры на {drone_info['ip']}:{drone_info['camera_port']}")
         if not self.check_camera_connection():
             print(f"Transport {self.id}: Не удалось подключиться к камере")
             self.running = False
+            self.frame_bus.stop()
             return
         self.video_thread = threading.Thread(target=self.show_video_stream)
         self.video_thread.start()
@@ -308,7 +330,7 @@ class TransportDrone:
         max_attempts = 10
         for attempt in range(max_attempts):
             try:
-                frame = self.camera.get_cv_frame()
+                frame = self.detector_frames.get(timeout=2)
                 if frame is not None:
                     print(f"Transport {self.id}: Камера подключена успешно (попытка {attempt + 1}/{max_attempts})")
                     return True
@@ -330,33 +352,34 @@ class TransportDrone:
 
     def detect_qr(self):
         try:
-            frame = self.camera.get_cv_frame()
+            packet = self.detector_frames.get(timeout=self.camera.timeout)
+            frame = packet.image if packet is not None else None
             if frame is None:
                 print(f"Transport {self.id}: Не удалось получить кадр")
                 return None
+            if time.time() - packet.timestamp > self.max_frame_age:
+                print(f"Transport {self.id}: Кадр устарел, пропускаю")
+                return None
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # Обнаружение QR-кодов
-            qr_codes = pyzbar.decode(gray)
-            if qr_codes:
-                qr_code = qr_codes[0]
-                data = qr_code.data.decode("utf-8")
-                process_qr_code(self.id, data)
-                points = np.array(qr_code.polygon)
-                coords = self.calculate_coords(points)
-                detect_object(self.drone, data)
-                return {"key": data, "coords": coords}
-
-            # Обнаружение ArUco-меток
-            corners, ids, _ = self.aruco_detector.detectMarkers(frame)
-            if ids is not None:
-                marker_id = ids[0][0]
-                process_aruco_marker(self.id, marker_id)
-                points = np.array(corners[0])
-                coords = self.calculate_coords(points)
-                detect_object(self.drone, f"ArUco_{marker_id}")
-                return {"key": f"ArUco_{marker_id}", "coords": coords}
+            # QR-коды идут в списке раньше ArUco-меток, поэтому приоритет у QR
+            detections = self.marker_detector.detect(frame, packet.seq)
+            if detections:
+                detection = detections[0]
+                if detection.kind == KIND_QR:
+                    process_qr_code(self.id, detection.data)
+                else:
+                    process_aruco_marker(self.id, detection.data)
+                # Положение ArUco-меток и QR-кодов известного размера по их вершинам, без высоты из телеметрии
+                poses = {}
+                if ARUCO_MARKER_SIZE is not None:
+                    poses = estimate_marker_poses(detections, ARUCO_MARKER_SIZE, self.camera_intrinsics)
+                if QR_EDGE_LENGTHS is not None:
+                    poses.update(estimate_qr_poses(to_gray(frame), detections, self.camera_intrinsics,
+                                                   QR_EDGE_LENGTHS))
+                coords = self.calculate_coords(detection.corners, packet.timestamp, poses.get(detection.key),
+                                               fuse=detection.kind == KIND_QR)
+                detect_object(self.drone, detection.key)
+                return {"key": detection.key, "coords": coords}
 
             print(f"Transport {self.id}: Ни QR-код, ни ArUco-метка не обнаружены")
             return None
@@ -364,43 +387,35 @@ class TransportDrone:
             print(f"Transport {self.id}: Ошибка с камерой: {e}")
             return None
 
-    def calculate_coords(self, points):
-        pos = self.drone.position[:3] if self.drone.position is not None else [0, 0, 0]
-        center = np.mean(points, axis=0)
-        shift_x_px = center[0] - self.frame_center[0]
-        shift_y_px = center[1] - self.frame_center[1]
-        shift_x_m = (shift_x_px * pos[2]) / 700
-        shift_y_m = (shift_y_px * pos[2]) / 700
+    def calculate_coords(self, points, timestamp=None, pose=None, fuse=False):
+        # Поза дрона на момент захвата кадра, если она есть в записи телеметрии
+        drone_pose = self.telemetry.pose_at(timestamp) if timestamp is not None else None
+        if drone_pose is not None:
+            pos = drone_pose[:3]
+        else:
+            pos = self.drone.position[:3] if self.drone.position is not None else [0, 0, 0]
+        if pose is not None:
+            if fuse:
+                # Дальность по размеру QR-кода уточняется высотой из телеметрии
+                pose = fuse_pose_with_altitude(pose, pos[2])
+            shift_x_m, shift_y_m = pose.tvec[0], pose.tvec[1]
+        else:
+            center = np.mean(points, axis=0)
+            shift_x_px = center[0] - self.frame_center[0]
+            shift_y_px = center[1] - self.frame_center[1]
+            shift_x_m = (shift_x_px * pos[2]) / 700
+            shift_y_m = (shift_y_px * pos[2]) / 700
         return [pos[0] + shift_x_m, pos[1] + shift_y_m, pos[2]]
 
     def show_video_stream(self):
         while self.running:
             try:
-                frame = self.camera.get_cv_frame()
+                packet = self.display_frames.get(timeout=self.camera.timeout)
+                frame = packet.image if packet is not None else None
                 if frame is not None:
-                    display_frame = frame.copy()
-                    gray = cv2.cvtColor(display_frame, cv2.COLOR_BGR2GRAY)
-
-                    # Отрисовка QR-кодов
-                    qr_codes = pyzbar.decode(gray)
-                    for qr_code in qr_codes:
-                        data = qr_code.data.decode("utf-8")
-                        (x, y, w, h) = qr_code.rect
-                        cv2.rectangle(display_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                        cv2.putText(display_frame, data, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                    # Отрисовка ArUco-меток
-                    corners, ids, _ = self.aruco_detector.detectMarkers(display_frame)
-                    if ids is not None:
-                        for i in range(len(ids)):
-                            marker_corners = corners[i][0]
-                            for j in range(4):
-                                start_point = tuple(map(int, marker_corners[j]))
-                                end_point = tuple(map(int, marker_corners[(j + 1) % 4]))
-                                cv2.line(display_frame, start_point, end_point, (0, 255, 0), 2)
-                            marker_id = ids[i][0]
-                            cv2.putText(display_frame, str(marker_id), tuple(map(int, marker_corners[0])),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+                    # Для кадра, уже обработанного detect_qr, берётся готовый результат
+                    detections = self.marker_detector.detect(frame, packet.seq)
+                    display_frame = draw_detections(frame.copy(), detections)
 
                     cv2.imshow(f"Transport {self.id} Stream", display_frame)
                     if cv2.waitKey(1) == 27:
@@ -408,6 +423,8 @@ class TransportDrone:
             except Exception as e:
                 print(f"Transport {self.id}: Ошибка с видеопотоком: {e}")
             time.sleep(0.1)
+        self.frame_bus.stop()
+        print(f"Transport {self.id}: фильтр кандидатов детектора меток {self.marker_detector.prefilter.stats()}")
 
     def transport_mission(self):
         if not self.running:
@@ -527,6 +544,12 @@ obstacles_map = {
 
 def main():
     config = CompetitionConfig()
+    # Выбор самого быстрого декодера QR по образцам кадров с кодами (папка qr_samples)
+    samples = load_sample_frames("qr_samples")
+    if samples:
+        decoder, report = calibrate_qr_decoder(samples)
+        set_default_qr_decoder(decoder)
+        print(f"Декодер QR: {decoder.name}, замеры: {report}")
     scouts = [ScoutDrone(config.scout_drones[i]) for i in range(2)]
     transports = [TransportDrone(config.trans_drones[i]) for i in range(2)]
     rts_units = [TransportRTS(config.rts_units[i]) for i in range(2)]
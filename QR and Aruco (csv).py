@@ -1,9 +1,7 @@
 import cv2
 import csv
-from pyzbar import pyzbar
 from datetime import datetime
 from rzd import *  # Ensure you have the appropriate import for the SocketCamera
-import cv2.aruco as aruco
 
 
 # Функция для обработки QR-кода
@@ -53,12 +51,8 @@ def main():
     # Используем камеру с IP и портом, соответствующими симулятору
     camera = SocketCamera(ip="127.0.0.1", port=18001)
 
-    # Загрузка словаря ArUco
-    aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_4X4_50)
-    parameters = aruco.DetectorParameters()
-
-    # Создаем детектор ArUco
-    detector = aruco.ArucoDetector(aruco_dict, parameters)
+    # Детектор QR-кодов и ArUco-меток (поиск ArUco идёт параллельно с pyzbar)
+    detector = MarkerDetector(parallel=True)
 
     while True:
         # Получаем кадр с камеры
@@ -67,48 +61,18 @@ def main():
             print("Не удалось получить кадр с камеры.")
             continue
 
-        # Преобразуем кадр в оттенки серого для распознавания QR-кодов
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        # Распознаем QR-коды
-        qr_codes = pyzbar.decode(gray)
-
-        # Обрабатываем каждый обнаруженный QR-код
-        for qr_code in qr_codes:
-            data = qr_code.data.decode("utf-8")
-            process_qr_code(data)
-
-            # Рисуем прямоугольник вокруг QR-кода
-            (x, y, w, h) = qr_code.rect
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-
-            # Добавляем текст с данными QR-кода
-            cv2.putText(frame, data, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-        # Поиск ArUco-меток
-        corners, ids, _ = detector.detectMarkers(frame)
-
-        # Если метки найдены
-        if ids is not None:
-            # Перебираем все найденные метки
-            for i in range(len(ids)):
-                # Получаем углы текущей метки
-                marker_corners = corners[i][0]
-
-                # Отрисовка квадрата вокруг метки
-                for j in range(4):
-                    # Соединяем углы линиями
-                    start_point = tuple(map(int, marker_corners[j]))
-                    end_point = tuple(map(int, marker_corners[(j + 1) % 4]))
-                    cv2.line(frame, start_point, end_point, (0, 255, 0), 2)
+        # Распознаем QR-коды и ArUco-метки
+        detections = detector.detect(frame)
 
-                # Отрисовка ID метки
-                marker_id = ids[i][0]
-                cv2.putText(frame, str(marker_id), tuple(map(int, marker_corners[0])),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        # Обрабатываем каждую обнаруженную метку
+        for detection in detections:
+            if detection.kind == KIND_QR:
+                process_qr_code(detection.data)
+            else:
+                process_aruco_marker(detection.data)
 
-                # Обработка метки
-                process_aruco_marker(marker_id)
+        # Рисуем рамки и подписи меток
+        draw_detections(frame, detections)
 
         # Отображаем кадр с выделенными QR-кодами и ArUco-метками
         cv2.imshow("Socket Camera with QR Code and ArUco Detection", frame)
@@ -0,0 +1,120 @@
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+from rzd.drone_cv import DecodePool, SocketCamera
+from rzd.fleet_receiver import FleetCameraReceiver
+
+
+# Нагрузочный тест приёма видео: сколько камер вытягивает один хост.
+# Серверы кадров (rzd.camera_server) запускаются отдельным процессом, чтобы их CPU не попадал в замер.
+
+def start_servers(ports, args):
+    command = [sys.executable, "-m", "rzd.camera_server", "--ports", *map(str, ports),
+               "--fps", str(args.fps), "--width", str(args.width), "--height", str(args.height),
+               "--loss", str(args.loss), "--reorder", str(args.reorder)]
+    if args.source:
+        command += ["--source", args.source]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    process.stdout.readline()  # Ждём сообщения о запуске
+    return process
+
+
+def run_fleet(cameras, duration, pool):
+    receiver = FleetCameraReceiver(decode_pool=pool)
+    for i, camera in enumerate(cameras):
+        receiver.add_camera(f"camera_{i}", camera)
+    receiver.start()
+    time.sleep(duration)
+    receiver.stop()
+
+
+def run_threads(cameras, duration):
+    running = True
+
+    def read(camera):
+        while running:
+            camera.get_cv_frame()
+
+    threads = [threading.Thread(target=read, args=(camera,), daemon=True) for camera in cameras]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    running = False
+    for thread in threads:
+        thread.join()
+    for camera in cameras:
+        camera.disconnect()
+
+
+def benchmark(count, base_port, args):
+    ports = list(range(base_port, base_port + count))
+    server = start_servers(ports, args)
+    pool = DecodePool(args.workers) if args.workers else None
+    try:
+        cameras = [SocketCamera("127.0.0.1", port, log_connection=False) for port in ports]
+        for camera in cameras:
+            camera.connect()
+        time.sleep(0.5)  # Прогрев: первые кадры и переподключения не считаем
+        for camera in cameras:
+            camera.metrics_snapshot()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if args.mode == "fleet":
+            run_fleet(cameras, args.duration, pool)
+        else:
+            run_threads(cameras, args.duration)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+    finally:
+        server.terminate()
+        server.wait()
+        if pool is not None:
+            pool.shutdown()
+    snapshots = [camera.metrics_snapshot() for camera in cameras]
+    expected = args.fps * wall
+    decoded_fps = [s["decoded_fps"] for s in snapshots]
+    delivered = sum(fps * wall for fps in decoded_fps)
+    drop_rate = 1.0 - delivered / (expected * count) if expected else 0.0
+    decode_p50 = [s["decode_time"]["p50_ms"] for s in snapshots]
+    return {
+        "streams": count,
+        "fps_per_stream": sum(decoded_fps) / count,
+        "min_fps": min(decoded_fps),
+        "drop_rate": max(drop_rate, 0.0),
+        "cpu_per_stream": 100.0 * cpu / wall / count,
+        "decode_p50_ms": max(v for v in decode_p50 if v is not None) if any(decode_p50) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк приёма видеопотоков SocketCamera")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--mode", choices=["fleet", "threads"], default="fleet",
+                        help="fleet - один поток на все камеры (FleetCameraReceiver), threads - поток на камеру")
+    parser.add_argument("--workers", type=int, default=0, help="Потоков DecodePool (0 - декодировать в потоке приёма)")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--base-port", type=int, default=19000)
+    parser.add_argument("--source")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    args = parser.parse_args()
+    if args.mode == "threads" and args.workers:
+        print("DecodePool используется только в режиме fleet, --workers игнорируется")
+
+    print(f"{'камер':>6} {'fps/камера':>11} {'мин fps':>8} {'потери':>7} {'CPU/камера':>11} {'decode p50':>11}")
+    base_port = args.base_port
+    for count in args.streams:
+        result = benchmark(count, base_port, args)
+        base_port += count
+        print(f"{result['streams']:>6} {result['fps_per_stream']:>11.1f} {result['min_fps']:>8.1f} "
+              f"{result['drop_rate']:>7.1%} {result['cpu_per_stream']:>10.1f}% {result['decode_p50_ms']!s:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,13 @@ from pion import Pion
 import time
 import cv2
 import numpy as np
-from pyzbar.pyzbar import decode
 import math
 # Импорт необходимых функций из модуля pion.functions
 from pion.functions import vector_reached, update_array
+from rzd.pyramid_detector import PyramidDetector
+
+# Грубый поиск на уменьшенном кадре, мелкие коды декодируются в исходном разрешении
+qr_detector = PyramidDetector(aruco_markers=False)
 
 # ------------------ Вспомогательные функции ------------------
 
@@ -68,20 +71,16 @@ def detect_qr_global(drone: Pion,
             print("Не удалось получить кадр")
             return {}, frame
 
-    # Уменьшение разрешения кадра для повышения производительности
-    frame = cv2.resize(frame, (640, 480))
-
     key_errors: Dict[str, np.ndarray] = {}
     try:
-        data = decode(frame)
-        if data:
-            print(f"Обработка кадра: найдено {len(data)} QR-кодов")
-            for item in data:
-                decoded_key = item[0].decode()
+        detections = qr_detector.detect(frame)
+        if detections:
+            print(f"Обработка кадра: найдено {len(detections)} QR-кодов")
+            for detection in detections:
+                decoded_key = detection.key
                 if decoded_key not in finished_targets:
                     drone.led_control(255, 0, 255, 0)  # Мигание светодиодами
-                    points = np.array(item[3])
-                    shift = calculate_shift_global(points, frame_center, drone.yaw, drone.position[2])
+                    shift = calculate_shift_global(detection.corners, frame_center, drone.yaw, drone.position[2])
                     if shift:
                         if coordinates_or_error:
                             error = np.array([-shift[0], shift[1], 0, 0])
@@ -1,2 +1,17 @@
 from .drone_controller import *
 from .drone_cv import *
+from .frame_bus import *
+from .fleet_receiver import *
+from .telemetry import *
+from .flight_record import *
+from .camera_metrics import *
+from .marker_detector import *
+from .roi_tracker import *
+from .candidates import *
+from .pyramid_detector import *
+from .decode_cache import *
+from .qr_backends import *
+from .frame_gating import *
+from .tiled_detector import *
+from .retry_ladder import *
+from .marker_pose import *
@@ -0,0 +1,135 @@
+import bisect
+import time
+from typing import Dict, Optional
+
+# Границы корзин гистограмм задержек в миллисекундах
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с фиксированными корзинами: добавление значения - один bisect,
+    поэтому её можно держать включённой постоянно.
+    """
+
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)  # Последняя корзина - больше максимума
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, seconds: float) -> None:
+        value_ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(self.buckets_ms, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Оценка процентиля (верхняя граница корзины, в которую он попадает), мс.
+        """
+        if self.count == 0:
+            return None
+        target = q / 100.0 * self.count
+        accumulated = 0
+        for i, bucket_count in enumerate(self.counts):
+            accumulated += bucket_count
+            if accumulated >= target:
+                return self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": self.max_ms,
+            "buckets_ms": list(self.buckets_ms),
+            "counts": list(self.counts),
+        }
+
+
+class CameraMetrics:
+    """
+    Счётчики и гистограммы камеры: принятые и декодированные кадры, потерянные
+    и незавершённые кадры, время imdecode и возраст кадра при выдаче потребителю.
+    """
+
+    def __init__(self):
+        self.created = time.time()
+        self.frames_received = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0  # Приняты, но вытеснены более свежими до декодирования
+        self.frames_partial = 0  # Не собраны целиком или не декодировались
+        self.decode_skipped = 0  # Декодирование пропущено (тот же кадр)
+        self.decode_time = LatencyHistogram()
+        self.frame_age = LatencyHistogram()
+        self._last_snapshot_time = self.created
+        self._last_received = 0
+        self._last_decoded = 0
+
+    def on_received(self, count: int = 1) -> None:
+        self.frames_received += count
+
+    def on_dropped(self, count: int = 1) -> None:
+        self.frames_dropped += count
+
+    def on_partial(self, count: int = 1) -> None:
+        self.frames_partial += count
+
+    def on_decoded(self, seconds: float) -> None:
+        self.frames_decoded += 1
+        self.decode_time.add(seconds)
+
+    def on_decode_skipped(self) -> None:
+        self.decode_skipped += 1
+
+    def on_consumed(self, capture_time: float) -> None:
+        self.frame_age.add(time.time() - capture_time)
+
+    def snapshot(self, extra: Optional[Dict[str, object]] = None, reset: bool = True) -> Dict[str, object]:
+        """
+        Возвращает текущие значения метрик. fps считается по интервалу с предыдущего снимка.
+
+        :param extra: Дополнительные значения для снимка.
+        :type extra: Optional[Dict[str, object]]
+        :param reset: Начать новый интервал подсчёта fps (False - только прочитать, как в summary).
+        :type reset: bool
+        :return: Значения метрик.
+        :rtype: Dict[str, object]
+        """
+        now = time.time()
+        interval = max(now - self._last_snapshot_time, 1e-9)
+        result = {
+            "uptime": now - self.created,
+            "received_fps": (self.frames_received - self._last_received) / interval,
+            "decoded_fps": (self.frames_decoded - self._last_decoded) / interval,
+            "frames_received": self.frames_received,
+            "frames_decoded": self.frames_decoded,
+            "frames_dropped": self.frames_dropped,
+            "frames_partial": self.frames_partial,
+            "decode_skipped": self.decode_skipped,
+            "decode_time": self.decode_time.snapshot(),
+            "frame_age": self.frame_age.snapshot(),
+        }
+        if extra:
+            result.update(extra)
+        if not reset:
+            return result
+        self._last_snapshot_time = now
+        self._last_received = self.frames_received
+        self._last_decoded = self.frames_decoded
+        return result
+
+    def summary(self) -> str:
+        """
+        Короткая строка для логов. Интервал подсчёта fps не сбрасывается.
+        """
+        snapshot = self.snapshot(reset=False)
+        return (f"rx {snapshot['received_fps']:.1f} fps, dec {snapshot['decoded_fps']:.1f} fps, "
+                f"drop {self.frames_dropped}, partial {self.frames_partial}, "
+                f"decode p50 {snapshot['decode_time']['p50_ms']} ms, age p95 {snapshot['frame_age']['p95_ms']} ms")
@@ -0,0 +1,181 @@
+import argparse
+import os
+import random
+import socket
+import threading
+import time
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+
+def synthetic_frames(count: int = 30, width: int = 640, height: int = 480, quality: int = 80) -> List[bytes]:
+    """
+    Генерирует JPEG кадры с движущимся узором и номером кадра.
+    """
+    frames = []
+    xs = np.linspace(0, 4 * np.pi, width, dtype=np.float32)
+    for i in range(count):
+        phase = 2 * np.pi * i / count
+        row = ((np.sin(xs + phase) + 1) * 127).astype(np.uint8)
+        image = np.repeat(np.repeat(row[np.newaxis, :, np.newaxis], height, axis=0), 3, axis=2)
+        cv2.putText(image, str(i), (20, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 3)
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames.append(jpeg.tobytes())
+    return frames
+
+
+def load_frames(source: str, width: Optional[int] = None, height: Optional[int] = None,
+                quality: int = 80) -> List[bytes]:
+    """
+    Загружает кадры из папки с изображениями или из записи полёта (путь без .dat/.idx).
+    Если задан размер, кадры перекодируются в него.
+    """
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+        frames = []
+        for name in names:
+            with open(os.path.join(source, name), "rb") as file:
+                frames.append(file.read())
+    else:
+        from .flight_record import FlightReader
+        with FlightReader(source) as reader:
+            frames = [bytes(payload) for _, _, payload in reader.frames()]
+    if width and height:
+        resized = []
+        for payload in frames:
+            image = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+            image = cv2.resize(image, (width, height))
+            resized.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+        frames = resized
+    return frames
+
+
+class FakeCameraServer:
+    """
+    Локальная замена камеры симулятора для нагрузочных тестов SocketCamera: принимает
+    TCP подключение и шлёт JPEG кадры UDP датаграммами на адрес, к которому привязан
+    клиент. Можно задать частоту кадров, долю потерянных датаграмм и долю переставленных кадров.
+    """
+
+    def __init__(self, frames: List[bytes], port: int, host: str = "127.0.0.1", fps: float = 30.0,
+                 loss_rate: float = 0.0, reorder_rate: float = 0.0, datagram_size: int = 65000,
+                 seed: Optional[int] = None):
+        self.frames = frames
+        self.host = host
+        self.port = port
+        self.fps = fps
+        self.loss_rate = loss_rate
+        self.reorder_rate = reorder_rate
+        self.datagram_size = datagram_size
+        self.frames_sent = 0
+        self.datagrams_lost = 0
+        self._random = random.Random(seed)
+        self._running = False
+        self._tcp: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._tcp.bind((self.host, self.port))
+        self._tcp.listen()
+        self._tcp.settimeout(0.5)
+        self.port = self._tcp.getsockname()[1]  # Для port=0 - выбранный системой порт
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._tcp is not None:
+            self._tcp.close()
+            self._tcp = None
+
+    def _accept_loop(self) -> None:
+        while self._running:
+            try:
+                client, address = self._tcp.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._stream, args=(client, address), daemon=True).start()
+
+    def _send_frame(self, udp: socket.socket, payload: bytes, address) -> None:
+        for start in range(0, len(payload), self.datagram_size):
+            if self._random.random() < self.loss_rate:
+                self.datagrams_lost += 1
+                continue
+            udp.sendto(payload[start:start + self.datagram_size], address)
+        self.frames_sent += 1
+
+    def _stream(self, client: socket.socket, address) -> None:
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        period = 1.0 / self.fps
+        next_time = time.perf_counter()
+        index = 0
+        held = None  # Кадр, отложенный для перестановки со следующим
+        try:
+            while self._running:
+                payload = self.frames[index % len(self.frames)]
+                index += 1
+                if held is None and self._random.random() < self.reorder_rate:
+                    held = payload
+                else:
+                    self._send_frame(udp, payload, address)
+                    if held is not None:
+                        self._send_frame(udp, held, address)
+                        held = None
+                next_time += period
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.perf_counter()
+        except OSError:
+            pass
+        finally:
+            udp.close()
+            client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальный сервер JPEG кадров по протоколу камеры симулятора")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ports", type=int, nargs="+", default=[18000])
+    parser.add_argument("--source", help="Папка с изображениями или запись полёта; по умолчанию синтетика")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--loss", type=float, default=0.0, help="Доля теряемых датаграмм")
+    parser.add_argument("--reorder", type=float, default=0.0, help="Доля переставляемых кадров")
+    parser.add_argument("--datagram-size", type=int, default=65000)
+    args = parser.parse_args()
+
+    if args.source:
+        frames = load_frames(args.source, args.width, args.height, args.quality)
+    else:
+        frames = synthetic_frames(30, args.width, args.height, args.quality)
+    servers = [FakeCameraServer(frames, port, args.host, args.fps, args.loss, args.reorder, args.datagram_size)
+               for port in args.ports]
+    for server in servers:
+        server.start()
+    print(f"Камеры запущены на портах {[server.port for server in servers]}, кадр {len(frames[0])} байт",
+          flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    for server in servers:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
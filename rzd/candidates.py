@@ -0,0 +1,211 @@
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from .camera_metrics import LatencyHistogram
+
+Rect = Tuple[int, int, int, int]
+
+
+def find_qr_candidates(gray: np.ndarray, min_size: int = 8, max_aspect: float = 2.5,
+                       min_fill: float = 0.45, max_candidates: int = 8) -> List[Rect]:
+    """
+    Ищет области, похожие на QR-код: плотные участки с высоким локальным контрастом,
+    близкие к квадрату. Работает на уменьшенном изображении и стоит несколько миллисекунд.
+
+    :param gray: Изображение в оттенках серого.
+    :type gray: np.ndarray
+    :param min_size: Минимальная сторона области в пикселях gray.
+    :type min_size: int
+    :param max_aspect: Максимальное отношение сторон области.
+    :type max_aspect: float
+    :param min_fill: Минимальная доля заполнения ограничивающего прямоугольника контуром.
+    :type min_fill: float
+    :param max_candidates: Сколько областей вернуть (самые крупные).
+    :type max_candidates: int
+    :return: Прямоугольники (x, y, w, h) в пикселях gray.
+    :rtype: List[Rect]
+    """
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Склеиваем модули кода в одно пятно
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    height, width = gray.shape[:2]
+    candidates = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if min(w, h) < min_size or w > 0.9 * width or h > 0.9 * height:
+            continue
+        if max(w, h) > max_aspect * min(w, h):
+            continue
+        if cv2.contourArea(contour) < min_fill * w * h:
+            continue
+        candidates.append((x, y, w, h))
+    candidates.sort(key=lambda rect: rect[2] * rect[3], reverse=True)
+    return candidates[:max_candidates]
+
+
+def find_quad_candidates(gray: np.ndarray, min_size: int = 8, max_aspect: float = 3.0,
+                         max_candidates: int = 16) -> List[Rect]:
+    """
+    Ищет выпуклые четырёхугольники (рамки ArUco-меток и шаблоны поиска QR-кодов)
+    по контурам адаптивно бинаризованного изображения.
+
+    :param gray: Изображение в оттенках серого.
+    :type gray: np.ndarray
+    :param min_size: Минимальная сторона четырёхугольника в пикселях gray.
+    :type min_size: int
+    :param max_aspect: Максимальное отношение сторон ограничивающего прямоугольника.
+    :type max_aspect: float
+    :param max_candidates: Сколько областей вернуть (самые крупные).
+    :type max_candidates: int
+    :return: Прямоугольники (x, y, w, h) в пикселях gray.
+    :rtype: List[Rect]
+    """
+    mask = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 7)
+    contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    candidates = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if min(w, h) < min_size or max(w, h) > max_aspect * min(w, h):
+            continue
+        approx = cv2.approxPolyDP(contour, 0.05 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            candidates.append((x, y, w, h))
+    candidates.sort(key=lambda rect: rect[2] * rect[3], reverse=True)
+    return candidates[:max_candidates]
+
+
+class CandidatePrefilter:
+    """
+    Дешёвая проверка перед декодерами: на уменьшенном кадре ищутся области, похожие на QR-код
+    (find_qr_candidates), и/или четырёхугольники (find_quad_candidates). Кадры без кандидатов
+    в pyzbar и детектор ArUco не передаются.
+
+    Чтобы знать, сколько кодов теряется, каждый audit_every-й отклонённый кадр всё равно
+    декодируется, и если в нём что-то нашлось, это засчитывается как ложноотрицательное
+    решение (false_negative_rate).
+    """
+
+    def __init__(self, width: int = 320, qr: bool = True, quads: bool = True, min_size: int = 6,
+                 min_fill: float = 0.45, max_aspect: float = 2.5, audit_every: int = 20):
+        """
+        :param width: Ширина уменьшенного кадра.
+        :type width: int
+        :param qr: Искать области, похожие на QR-код.
+        :type qr: bool
+        :param quads: Искать четырёхугольники (ArUco-метки, шаблоны поиска QR).
+        :type quads: bool
+        :param min_size: Минимальная сторона кандидата на уменьшенном кадре.
+        :type min_size: int
+        :param min_fill: Минимальная заполненность области QR-кандидата.
+        :type min_fill: float
+        :param max_aspect: Максимальное отношение сторон кандидата.
+        :type max_aspect: float
+        :param audit_every: Каждый какой отклонённый кадр проверять декодером (0 - не проверять).
+        :type audit_every: int
+        """
+        self.width = width
+        self.qr = qr
+        self.quads = quads
+        self.min_size = min_size
+        self.min_fill = min_fill
+        self.max_aspect = max_aspect
+        self.audit_every = audit_every
+        self.passed = 0
+        self.rejected = 0
+        self.audited = 0
+        self.false_negatives = 0
+        self.check_time = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    def check(self, gray: np.ndarray) -> bool:
+        """
+        Проверяет, есть ли в кадре кандидаты.
+
+        :param gray: Кадр в оттенках серого.
+        :type gray: np.ndarray
+        :return: True, если кадр нужно передать декодерам.
+        :rtype: bool
+        """
+        started = time.perf_counter()
+        scale = min(self.width / gray.shape[1], 1.0)
+        small = gray if scale >= 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        found = bool(self.qr and find_qr_candidates(small, self.min_size, self.max_aspect, self.min_fill, 1))
+        if not found and self.quads:
+            found = bool(find_quad_candidates(small, self.min_size, self.max_aspect, 1))
+        with self._lock:
+            self.check_time.add(time.perf_counter() - started)
+            if found:
+                self.passed += 1
+            else:
+                self.rejected += 1
+        return found
+
+    def audit_due(self) -> bool:
+        """
+        True, если последний отклонённый кадр нужно проверить декодером.
+        """
+        return self.audit_every > 0 and self.rejected % self.audit_every == 0
+
+    def record_audit(self, found: bool) -> None:
+        with self._lock:
+            self.audited += 1
+            if found:
+                self.false_negatives += 1
+
+    @property
+    def false_negative_rate(self) -> float:
+        return self.false_negatives / self.audited if self.audited else 0.0
+
+    def stats(self) -> Dict[str, object]:
+        total = self.passed + self.rejected
+        return {
+            "passed": self.passed,
+            "rejected": self.rejected,
+            "reject_ratio": self.rejected / total if total else 0.0,
+            "audited": self.audited,
+            "false_negatives": self.false_negatives,
+            "false_negative_rate": self.false_negative_rate,
+            "check_p50_ms": self.check_time.percentile(50),
+        }
+
+
+def evaluate_prefilter(prefilter: CandidatePrefilter, frames, detector) -> Dict[str, float]:
+    """
+    Оценивает фильтр на образцах кадров: каждый кадр проверяется фильтром и декодируется
+    детектором без фильтра (например, MarkerDetector). Позволяет подобрать параметры фильтра,
+    выбирая между пропусками кодов и нагрузкой на CPU.
+
+    :param prefilter: Проверяемый фильтр.
+    :type prefilter: CandidatePrefilter
+    :param frames: Кадры BGR или в оттенках серого.
+    :param detector: Детектор с методом detect(frame).
+    :return: Доля отклонённых кадров, доля пропущенных кадров с метками, время фильтра и детектора.
+    :rtype: Dict[str, float]
+    """
+    with_markers = missed = rejected = 0
+    check_time = detect_time = 0.0
+    for frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        started = time.perf_counter()
+        passed = prefilter.check(gray)
+        check_time += time.perf_counter() - started
+        started = time.perf_counter()
+        found = bool(detector.detect(gray))
+        detect_time += time.perf_counter() - started
+        rejected += not passed
+        with_markers += found
+        missed += found and not passed
+    count = max(len(frames), 1)
+    return {
+        "reject_ratio": rejected / count,
+        "false_negative_rate": missed / with_markers if with_markers else 0.0,
+        "check_ms": check_time / count * 1000.0,
+        "detect_ms": detect_time / count * 1000.0,
+    }
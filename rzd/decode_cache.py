@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+CachedCode = Tuple[str, str, object, np.ndarray]  # (kind, key, data, вершины)
+
+
+def perceptual_hash(gray: np.ndarray, size: int = 32) -> np.ndarray:
+    """
+    Средний хэш (aHash) изображения: вырезка приводится к size x size, и каждый бит показывает,
+    светлее ли пиксель среднего. Не зависит от масштаба и яркости вырезки. Размер выбран так,
+    чтобы разные QR-коды одной версии отличались хотя бы на десяток бит.
+
+    :param gray: Изображение в оттенках серого.
+    :type gray: np.ndarray
+    :param size: Сторона хэша в битах.
+    :type size: int
+    :return: Массив из size * size булевых значений.
+    :rtype: np.ndarray
+    """
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+    return (small > small.mean()).ravel()
+
+
+class _Entry:
+    def __init__(self, key: bytes, bits: np.ndarray, codes: List[CachedCode]):
+        self.key = key
+        self.bits = bits
+        self.codes = codes  # Вершины в долях размера вырезки
+        self.created = time.monotonic()
+
+
+class DecodeCache:
+    """
+    LRU кэш результатов декодирования вырезок-кандидатов. Ключ - перцептивный хэш вырезки:
+    если содержимое не изменилось заметно (расстояние Хэмминга не больше max_distance),
+    данные кода берутся из кэша, а вершины пересчитываются под размер текущей вырезки.
+    Записи вытесняются по возрасту (max_age) и по количеству (max_entries).
+    Пустые результаты тоже кэшируются, чтобы не декодировать повторно заведомо пустую область.
+    """
+
+    def __init__(self, max_entries: int = 64, max_age: float = 2.0, max_distance: int = 8, hash_size: int = 32):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float) -> None:
+        # Записи упорядочены по последнему обращению, но возраст считается от создания
+        for key in [key for key, entry in self._entries.items() if now - entry.created > self.max_age]:
+            del self._entries[key]
+
+    def lookup(self, crop: np.ndarray) -> Tuple[np.ndarray, Optional[List[CachedCode]]]:
+        """
+        Ищет результат для вырезки.
+
+        :param crop: Вырезка в оттенках серого.
+        :type crop: np.ndarray
+        :return: Хэш вырезки (для store) и коды (kind, key, data, вершины в пикселях вырезки)
+            или None, если записи нет.
+        :rtype: Tuple[np.ndarray, Optional[List[CachedCode]]]
+        """
+        bits = perceptual_hash(crop, self.hash_size)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(bits.tobytes())
+            if entry is None:
+                for candidate in reversed(self._entries.values()):
+                    if np.count_nonzero(candidate.bits != bits) <= self.max_distance:
+                        entry = candidate
+                        break
+            if entry is None:
+                self.misses += 1
+                return bits, None
+            self._entries.move_to_end(entry.key)
+            self.hits += 1
+        size = np.array([crop.shape[1], crop.shape[0]], dtype=np.float32)
+        return bits, [(kind, key, data, corners * size) for kind, key, data, corners in entry.codes]
+
+    def store(self, bits: np.ndarray, crop: np.ndarray, codes: List[CachedCode]) -> None:
+        """
+        Сохраняет результат декодирования вырезки (вершины в пикселях вырезки).
+        """
+        size = np.array([crop.shape[1], crop.shape[0]], dtype=np.float32)
+        entry = _Entry(bits.tobytes(), bits,
+                       [(kind, key, data, np.asarray(corners, dtype=np.float32) / size)
+                        for kind, key, data, corners in codes])
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._entries.move_to_end(entry.key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
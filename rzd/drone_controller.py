@@ -3,17 +3,31 @@ from pion import Pion
 import time
 import cv2
 import numpy as np
-from pyzbar.pyzbar import decode
 import math
 # Импорт необходимых функций из модуля pion.functions
 from pion.functions import vector_reached, update_array
+from .drone_cv import BaseCamera, RTSPCamera, to_gray
+from .telemetry import TelemetryRecorder
+from .marker_detector import MarkerDetector
+from .roi_tracker import RoiTracker
+from .pyramid_detector import PyramidDetector
+from .decode_cache import DecodeCache
+from .retry_ladder import RetryLadder
+from .marker_pose import (CameraIntrinsics, MarkerPose, camera_intrinsics, estimate_marker_poses, estimate_qr_poses,
+                          fuse_pose_with_altitude)
+
+# Детектор по умолчанию для detect_qr_global: только QR-коды, от грубого к точному.
+# Общий для всех дронов и потоков, поэтому без состояния между кадрами: кэш и лестница
+# предобработки включаются в детекторах отдельных вызовов (move_to_target, DroneScanner)
+_qr_detector = PyramidDetector(aruco_markers=False)
 
 # ------------------ Вспомогательные функции ------------------
 
 def calculate_shift_global(points: np.ndarray, 
                            frame_center: Tuple[int, int],
                            yaw: float,
-                           altitude: float) -> List[float]:
+                           altitude: float,
+                           scale: float = 1.0) -> List[float]:
     """
     Вычисляет смещение QR-кода относительно центра кадра.
 
@@ -25,10 +39,12 @@ def calculate_shift_global(points: np.ndarray,
     :type yaw: float
     :param altitude: Текущая высота дрона.
     :type altitude: float
+    :param scale: Масштаб кадра, в котором найдены points, относительно исходного (CameraFrame.scale).
+    :type scale: float
     :return: Список с корректированными смещениями [x, y].
     :rtype: List[float]
     """
-    qr_center = np.mean(points, axis=0)
+    qr_center = np.mean(points, axis=0) / scale
     shift_x_px = qr_center[0] - frame_center[0]
     shift_y_px = qr_center[1] - frame_center[1]
     shift_x_m = (shift_x_px * altitude) / 700  # 700 – фокальная длина
@@ -38,20 +54,79 @@ def calculate_shift_global(points: np.ndarray,
     corrected_y = shift_x_m * math.sin(yaw) + shift_y_m * math.cos(yaw)
     return [corrected_x, corrected_y]
 
+def calculate_pose_shift_global(pose: MarkerPose, yaw: float) -> List[float]:
+    """
+    Вычисляет смещение ArUco-метки по её положению из solvePnP (см. estimate_marker_poses).
+    В отличие от calculate_shift_global, не использует высоту из телеметрии и фокусное расстояние 700.
+
+    :param pose: Положение метки в системе камеры.
+    :type pose: MarkerPose
+    :param yaw: Текущий угол поворота дрона (в радианах).
+    :type yaw: float
+    :return: Список с корректированными смещениями [x, y].
+    :rtype: List[float]
+    """
+    shift_x_m, shift_y_m = float(pose.tvec[0]), float(pose.tvec[1])
+    corrected_x = shift_x_m * math.cos(yaw) - shift_y_m * math.sin(yaw)
+    corrected_y = shift_x_m * math.sin(yaw) + shift_y_m * math.cos(yaw)
+    return [corrected_x, corrected_y]
+
+def image_velocity(velocity: np.ndarray,
+                   yaw: float,
+                   altitude: float,
+                   scale: float = 1.0) -> np.ndarray:
+    """
+    Пересчитывает скорость дрона в скорость сдвига неподвижной цели в кадре (обратное к calculate_shift_global).
+
+    :param velocity: Скорость дрона [vx, vy] в м/с.
+    :type velocity: np.ndarray
+    :param yaw: Текущий угол поворота дрона (в радианах).
+    :type yaw: float
+    :param altitude: Текущая высота дрона.
+    :type altitude: float
+    :param scale: Масштаб кадра относительно исходного (CameraFrame.scale).
+    :type scale: float
+    :return: Скорость цели в кадре [vx, vy] в пикселях в секунду.
+    :rtype: np.ndarray
+    """
+    if altitude <= 0:
+        return np.zeros(2)
+    vx, vy = velocity[0], velocity[1]
+    shift_x_m = vx * math.cos(yaw) - vy * math.sin(yaw)
+    shift_y_m = -vx * math.sin(yaw) - vy * math.cos(yaw)
+    return np.array([shift_x_m, shift_y_m]) * 700 / altitude * scale  # 700 – фокальная длина
+
 def detect_qr_global(drone: Pion,
                      cap: cv2.VideoCapture, 
                      finished_targets: List[str],
                      frame_center: Tuple[int, int], 
-                     coordinates_or_error: bool = True
+                     coordinates_or_error: bool = True,
+                     telemetry: Optional[TelemetryRecorder] = None,
+                     max_frame_age: float = float('inf'),
+                     detector: Optional[MarkerDetector] = None,
+                     tracker: Optional[RoiTracker] = None,
+                     marker_size: Optional[float] = None,
+                     intrinsics: Optional[CameraIntrinsics] = None,
+                     qr_sizes: Optional[Dict[str, float]] = None
                     ) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
     """
     Считывает кадр из видеопотока, ищет QR-коды и вычисляет error-вектор. Если coordinates_or_error=True,
     возвращается вектор смещения относительно дрона; иначе вектор суммируется с координатами дрона для получения
     глобальных координат.
 
+    Если передан telemetry и источник кадров - BaseCamera, поза дрона интерполируется на момент захвата кадра,
+    а кадры старше max_frame_age секунд не обрабатываются.
+
+    Если задан marker_size, смещение ArUco-меток вычисляется по их положению из solvePnP (estimate_marker_poses),
+    а не по центру метки и высоте из телеметрии.
+
+    Если задан qr_sizes (измеренные размеры кодов), так же по видимому размеру (estimate_qr_poses)
+    оценивается положение QR-кодов; их дальность объединяется с высотой из телеметрии
+    (fuse_pose_with_altitude). Положение ArUco-меток с высотой не объединяется.
+
     :param drone: Объект дрона.
     :type drone: Pion
-    :param cap: Объект VideoCapture.
+    :param cap: Объект VideoCapture или RTSPCamera.
     :type cap: cv2.VideoCapture
     :param finished_targets: Список уже обработанных QR-кодов.
     :type finished_targets: List[str]
@@ -59,29 +134,77 @@ def detect_qr_global(drone: Pion,
     :type frame_center: Tuple[int, int]
     :param coordinates_or_error: Флаг выбора типа возвращаемых координат.
     :type coordinates_or_error: bool
+    :param telemetry: Запись телеметрии дрона для синхронизации позы с кадром.
+    :type telemetry: Optional[TelemetryRecorder]
+    :param max_frame_age: Максимальный возраст кадра в секундах.
+    :type max_frame_age: float
+    :param detector: Детектор меток (по умолчанию общий детектор QR-кодов).
+    :type detector: Optional[MarkerDetector]
+    :param tracker: Трекер меток: декодируется только область вокруг прогноза положения цели.
+        Скорость сдвига цели в кадре берётся из telemetry, если он передан.
+    :type tracker: Optional[RoiTracker]
+    :param marker_size: Длина стороны ArUco-меток, м.
+    :type marker_size: Optional[float]
+    :param intrinsics: Параметры камеры (по умолчанию фокусное расстояние 700 и главная точка frame_center).
+    :type intrinsics: Optional[CameraIntrinsics]
+    :param qr_sizes: Длина стороны QR-кода (м) по префиксу данных, например {"Box": 0.2}.
+    :type qr_sizes: Optional[Dict[str, float]]
     :return: Кортеж (словарь обнаруженных QR, считанный кадр).
     :rtype: Tuple[Dict[str, np.ndarray], np.ndarray]
     """
+    scale = 1.0
+    capture_time = None
     with drone._handler_lock:
-        ret, frame = cap.read()
+        if isinstance(cap, BaseCamera):
+            packet = cap.get_stamped_frame()
+            ret = packet is not None
+            frame = packet.image if ret else None
+            scale = packet.scale if ret else 1.0
+            capture_time = packet.timestamp if ret else None
+        else:
+            ret, frame = cap.read()
         if not ret:
             print("Не удалось получить кадр")
             return {}, frame
     key_errors: Dict[str, np.ndarray] = {}
-    data = decode(frame)
-    if data:
-        for item in data:
-            decoded_key = item[0].decode()
+    xyz, yaw, altitude = drone.xyz, drone.yaw, drone.position[2]
+    if capture_time is not None:
+        if time.time() - capture_time > max_frame_age:
+            print("Кадр устарел, пропускаем")
+            return key_errors, frame
+        pose = telemetry.pose_at(capture_time) if telemetry is not None else None
+        if pose is not None:
+            xyz, yaw, altitude = pose[:3], pose[3], pose[2]
+    if tracker is not None:
+        velocity = None
+        if telemetry is not None and capture_time is not None:
+            velocity = telemetry.velocity_at(capture_time)
+        pixel_velocity = image_velocity(velocity, yaw, altitude, scale) if velocity is not None else None
+        detections = tracker.detect(frame, capture_time, pixel_velocity)
+    else:
+        detections = (detector or _qr_detector).detect(frame)
+    poses: Dict[str, MarkerPose] = {}
+    intrinsics = intrinsics or camera_intrinsics(frame_center)
+    if detections and marker_size is not None:
+        poses = estimate_marker_poses(detections, marker_size, intrinsics, scale)
+    if detections and qr_sizes is not None:
+        for qr_key, pose in estimate_qr_poses(to_gray(frame), detections, intrinsics, qr_sizes, scale).items():
+            poses[qr_key] = fuse_pose_with_altitude(pose, altitude)
+    if detections:
+        for detection in detections:
+            decoded_key = detection.key
             if decoded_key not in finished_targets:
                 drone.led_control(255, 0, 255, 0)
-                points = np.array(item[3])
-                shift = calculate_shift_global(points, frame_center, drone.yaw, drone.position[2])
+                if decoded_key in poses:
+                    shift = calculate_pose_shift_global(poses[decoded_key], yaw)
+                else:
+                    shift = calculate_shift_global(detection.corners, frame_center, yaw, altitude, scale)
                 if shift:
                     if coordinates_or_error:
                         error = np.array([-shift[0], shift[1], 0, 0])
                     else:
-                        error = np.array([-shift[0] + drone.xyz[0],
-                                          shift[1] + drone.xyz[1], 0, 0])
+                        error = np.array([-shift[0] + xyz[0],
+                                          shift[1] + xyz[1], 0, 0])
                     key_errors[decoded_key] = error
                     print(f"Обнаружен: {decoded_key} = {error}")
                 drone.led_control(255, 0, 0, 0)
@@ -95,14 +218,20 @@ def move_to_target(drone: Pion,
                    key: str = '4',
                    scaling_factor: float = 0.5, 
                    threshold: float = 0.05,
-                   time_break: float = float('inf')
+                   time_break: float = float('inf'),
+                   telemetry: Optional[TelemetryRecorder] = None,
+                   max_frame_age: float = float('inf'),
+                   tracking: bool = False,
+                   marker_size: Optional[float] = None,
+                   intrinsics: Optional[CameraIntrinsics] = None,
+                   qr_sizes: Optional[Dict[str, float]] = None
                    ) -> Tuple[List[str], np.ndarray]:
     """
     Корректирует позицию дрона с помощью видеопотока до достижения заданной точности для указанного QR-кода.
 
     :param drone: Объект дрона.
     :type drone: Pion
-    :param cap: Объект VideoCapture.
+    :param cap: Объект VideoCapture или RTSPCamera.
     :type cap: cv2.VideoCapture
     :param frame_center: Центр кадра (ширина, высота).
     :type frame_center: Tuple[int, int]
@@ -118,17 +247,37 @@ def move_to_target(drone: Pion,
     :type threshold: float
     :param time_break: Максимальное время работы корректировки.
     :type time_break: float
+    :param telemetry: Запись телеметрии дрона для синхронизации позы с кадром.
+    :type telemetry: Optional[TelemetryRecorder]
+    :param max_frame_age: Максимальный возраст кадра в секундах.
+    :type max_frame_age: float
+    :param tracking: Декодировать только область вокруг прогноза положения цели (полный кадр - периодически).
+    :type tracking: bool
+    :param marker_size: Длина стороны ArUco-меток, м: смещение до них вычисляется через solvePnP.
+    :type marker_size: Optional[float]
+    :param intrinsics: Параметры камеры для solvePnP.
+    :type intrinsics: Optional[CameraIntrinsics]
+    :param qr_sizes: Длина стороны QR-кода (м) по префиксу данных: дальность до кода оценивается по его размеру.
+    :type qr_sizes: Optional[Dict[str, float]]
     :return: Кортеж (обновлённый список finished_targets, конечные координаты дрона).
     :rtype: Tuple[List[str], np.ndarray]
     """
     errors = np.zeros((10, 4))
     flag_reach_zero_error = False
     drone.speed_flag = False
+    # Свой детектор на вызов: кэш и бюджет лестницы не делятся с другими дронами.
+    # Кэш избавляет от повторного декодирования одних и тех же кодов, пока дрон висит над ними,
+    # а лестница предобработки дочитывает кандидатов при бликах и низком контрасте
+    detector = PyramidDetector(aruco_markers=marker_size is not None, cache=DecodeCache(), retry=RetryLadder())
+    tracker = RoiTracker(detector) if tracking else None
     t_0 = time.time()
     while not flag_reach_zero_error:
         if time.time() - t_0 > time_break:
             break
-        key_errors, frame = detect_qr_global(drone, cap, finished_targets, frame_center)
+        key_errors, frame = detect_qr_global(drone, cap, finished_targets, frame_center,
+                                             telemetry=telemetry, max_frame_age=max_frame_age, detector=detector,
+                                             tracker=tracker, marker_size=marker_size, intrinsics=intrinsics,
+                                             qr_sizes=qr_sizes)
         print("key_errors =", key_errors)
         if key in key_errors:
             if show:
@@ -155,7 +304,10 @@ class DroneScanner:
     """
     FOCAL_LENGTH: int = 700
 
-    def __init__(self, drone: Pion, base_coords: np.ndarray, scan_points: np.ndarray, show: bool = False) -> None:
+    def __init__(self, drone: Pion, base_coords: np.ndarray, scan_points: np.ndarray, show: bool = False,
+                 latest_frame: bool = False, telemetry: Optional[TelemetryRecorder] = None,
+                 max_frame_age: float = float('inf'), camera: Optional[BaseCamera] = None,
+                 tracking: bool = False, detector: Optional[MarkerDetector] = None) -> None:
         """
         Инициализирует дрона-сканер.
 
@@ -167,15 +319,36 @@ class DroneScanner:
         :type scan_points: np.ndarray
         :param show: Флаг отображения видеопотока.
         :type show: bool
+        :param latest_frame: Флаг фонового захвата только последнего кадра (без задержки буфера FFmpeg).
+        :type latest_frame: bool
+        :param telemetry: Запись телеметрии дрона для синхронизации позы с кадром.
+        :type telemetry: Optional[TelemetryRecorder]
+        :param max_frame_age: Максимальный возраст кадра в секундах.
+        :type max_frame_age: float
+        :param camera: Источник кадров вместо RTSP потока дрона (например, ReplayCamera).
+        :type camera: Optional[BaseCamera]
+        :param tracking: Отслеживать найденные QR-коды при пролёте между точками (process_mission_point);
+            execute_scan декодирует по одному кадру в точке и трекер не использует.
+        :type tracking: bool
+        :param detector: Детектор QR-кодов (например, TiledDetector для потоков 1080p).
+        :type detector: Optional[MarkerDetector]
         :return: None
         """
         self.show = show
+        self.telemetry = telemetry
+        self.max_frame_age = max_frame_age
         self.drone: Pion = drone
         self.base_coords: np.ndarray = base_coords
         self.scan_points: np.ndarray = scan_points
         self.unique_points: Dict[str, List[np.ndarray]] = {}  # Накопление QR-кодов
         self.rtsp_url: str = f'rtsp://{self.drone.ip}:8554/front'
-        self.cap: cv2.VideoCapture = cv2.VideoCapture(self.rtsp_url)
+        self.cap: BaseCamera = camera if camera is not None else RTSPCamera(self.rtsp_url,
+                                                                            latest_frame=latest_frame)
+        # Фильтр кандидатов (CandidatePrefilter) и пропуск смазанных кадров (SharpnessGate) не включены:
+        # в точке облёта делается одна попытка, её нельзя терять
+        self.marker_detector: MarkerDetector = detector if detector is not None else PyramidDetector(
+            aruco_markers=False, cache=DecodeCache(), retry=RetryLadder())
+        self.tracker: Optional[RoiTracker] = RoiTracker(self.marker_detector) if tracking else None
         self.initialize_drone()
 
     def initialize_drone(self) -> None:
@@ -207,7 +380,8 @@ class DroneScanner:
                   cap: cv2.VideoCapture, 
                   frame_center: Tuple[int, int],
                   finished_targets: Optional[List[str]] = None,
-                  coordinates_or_error: bool = True
+                  coordinates_or_error: bool = True,
+                  use_tracker: bool = False
                  ) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
         """
         Обёртка для функции detect_qr_global.
@@ -220,10 +394,14 @@ class DroneScanner:
         :type finished_targets: Optional[List[str]]
         :param coordinates_or_error: Флаг выбора типа возвращаемых координат.
         :type coordinates_or_error: bool
+        :param use_tracker: Искать коды через трекер (только вокруг прогноза положения).
+        :type use_tracker: bool
         :return: Кортеж (словарь обнаруженных QR, считанный кадр).
         :rtype: Tuple[Dict[str, np.ndarray], np.ndarray]
         """
-        return detect_qr_global(self.drone, cap, finished_targets or [], frame_center, coordinates_or_error)
+        return detect_qr_global(self.drone, cap, finished_targets or [], frame_center, coordinates_or_error,
+                                self.telemetry, self.max_frame_age, self.marker_detector,
+                                self.tracker if use_tracker else None)
 
     def process_mission_point(self,
                               target_point: Tuple[float, float],
@@ -242,6 +420,8 @@ class DroneScanner:
         frame_center = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) // 2,
                         int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) // 2)
         self.drone.speed_flag = False
+        if self.tracker is not None:
+            self.tracker.reset()
         while True:
             if self.drone.xyz[1] > target_point[1]:
                 break
@@ -250,7 +430,8 @@ class DroneScanner:
             if vector_length > 0:
                 vector_speed = vector_speed / vector_length * 0.1
                 self.drone.send_speed(vector_speed[0], vector_speed[1], 0, 0)
-            key_errors, frame = self.detect_qr(self.cap, frame_center, finished_targets, coordinates_or_error=False)
+            key_errors, frame = self.detect_qr(self.cap, frame_center, finished_targets, coordinates_or_error=False,
+                                               use_tracker=True)
             for key, error in key_errors.items():
                 self.unique_points.setdefault(key, []).append(error)
                 finished_targets.append(key)
@@ -336,7 +517,8 @@ class DroneDeliverer:
                  base_coords: np.ndarray,
                  delivery_points: List[Tuple[float, float, float, float]],
                  mission_keys: Optional[List[str]] = None,
-                 show: bool = False) -> None:
+                 show: bool = False,
+                 latest_frame: bool = False) -> None:
         """
         Инициализирует дрона-доставщика.
 
@@ -348,9 +530,12 @@ class DroneDeliverer:
         :type delivery_points: List[Tuple[float, float, float, float]]
         :param mission_keys: Список QR-кодов, для которых необходимо выполнить доставку.
         :type mission_keys: Optional[List[str]]
+        :param latest_frame: Флаг фонового захвата только последнего кадра (без задержки буфера FFmpeg).
+        :type latest_frame: bool
         :return: None
         """
         self.drone: Pion = drone
+        self.latest_frame = latest_frame
         self.base_coords: np.ndarray = base_coords
         self.show = show
         self.delivery_points: List[Tuple[float, float, float, float]] = delivery_points
@@ -420,7 +605,7 @@ class DroneDeliverer:
             self.drone.speed_flag = False
             time.sleep(2)
             rtsp_url = f'rtsp://{self.drone.ip}:8554/front'
-            cap = cv2.VideoCapture(rtsp_url)
+            cap = RTSPCamera(rtsp_url, latest_frame=self.latest_frame)
             if not cap.isOpened():
                 print(f"Не удалось открыть видеопоток для '{target_key}' на точке {point}")
                 continue
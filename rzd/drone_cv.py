@@ -1,9 +1,107 @@
 import cv2
+import errno
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
+import os
+import select
 import socket
+import threading
+import time
+import zlib
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from .camera_metrics import CameraMetrics
+
+JPEG_SOI = b'\xff\xd8'  # Маркер начала JPEG
+JPEG_EOI = b'\xff\xd9'  # Маркер конца JPEG
+
+# Режимы декодирования кадров: режим -> (флаг cv2.imdecode, масштаб относительно исходного кадра)
+DECODE_MODES = {
+    "color": (cv2.IMREAD_COLOR, 1.0),
+    "gray": (cv2.IMREAD_GRAYSCALE, 1.0),
+    "color_2": (cv2.IMREAD_REDUCED_COLOR_2, 0.5),
+    "color_4": (cv2.IMREAD_REDUCED_COLOR_4, 0.25),
+    "color_8": (cv2.IMREAD_REDUCED_COLOR_8, 0.125),
+    "gray_2": (cv2.IMREAD_REDUCED_GRAYSCALE_2, 0.5),
+    "gray_4": (cv2.IMREAD_REDUCED_GRAYSCALE_4, 0.25),
+    "gray_8": (cv2.IMREAD_REDUCED_GRAYSCALE_8, 0.125),
+}
+
+
+# Кадр вместе с метаданными захвата
+class CameraFrame(NamedTuple):
+    image: np.ndarray
+    timestamp: float  # Время захвата кадра (time.time())
+    seq: int  # Порядковый номер кадра у источника
+    scale: float = 1.0  # Масштаб изображения относительно исходного кадра камеры
+
+
+def to_gray(frame: np.ndarray) -> np.ndarray:
+    """
+    Возвращает кадр в оттенках серого, не конвертируя его повторно, если он уже серый.
+    """
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
 # Абстрактный базовый класс для камеры
 class BaseCamera(ABC):
+    decode_mode: str = "color"
+
+    def set_decode_mode(self, mode: str) -> None:
+        """
+        Задаёт режим декодирования: color, gray или уменьшенные color_2/4/8, gray_2/4/8.
+        """
+        if mode not in DECODE_MODES:
+            raise ValueError(f"Неизвестный режим декодирования: {mode}")
+        self.decode_mode = mode
+
+    @property
+    def decode_scale(self) -> float:
+        return DECODE_MODES[self.decode_mode][1]
+
+    @property
+    def metrics(self) -> CameraMetrics:
+        metrics = self.__dict__.get("_metrics")
+        if metrics is None:
+            metrics = self._metrics = CameraMetrics()
+        return metrics
+
+    def metrics_snapshot(self) -> dict:
+        """
+        Снимок метрик камеры: fps приёма и декодирования, потери, время imdecode, возраст кадров.
+        """
+        return self.metrics.snapshot()
+
+    def decode_jpeg(self, buffer) -> Optional[np.ndarray]:
+        """
+        Декодирует JPEG из буфера в текущем режиме декодирования.
+        """
+        started = time.perf_counter()
+        frame = cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), DECODE_MODES[self.decode_mode][0])
+        if frame is None:
+            self.metrics.on_partial()
+        else:
+            self.metrics.on_decoded(time.perf_counter() - started)
+        return frame
+
+    def apply_decode_mode(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Приводит уже декодированный цветной кадр к текущему режиму декодирования
+        (для источников, которые декодируют кадры сами, например VideoCapture).
+        """
+        if self.decode_mode == "color":
+            return frame
+        if self.decode_mode.startswith("gray"):
+            frame = to_gray(frame)
+        scale = self.decode_scale
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return frame
+
     @abstractmethod
     def get_cv_frame(self) -> np.ndarray:
         """
@@ -11,30 +109,227 @@ class BaseCamera(ABC):
         """
         pass
 
+    def get_stamped_frame(self) -> Optional[CameraFrame]:
+        """
+        Возвращает кадр вместе со временем захвата или None, если кадр не получен.
+        Реализации, знающие точное время захвата, переопределяют этот метод.
+        """
+        frame = self.get_cv_frame()
+        if frame is None:
+            return None
+        self._stamped_seq = getattr(self, "_stamped_seq", 0) + 1
+        return CameraFrame(frame, time.time(), self._stamped_seq, self.decode_scale)
+
 
 # Реализация для RTSP камеры
 class RTSPCamera(BaseCamera):
-    def __init__(self, rtsp_url: str):
+    """
+    RTSP камера. В режиме latest_frame фоновый поток непрерывно вызывает grab(),
+    а retrieve() выполняется только по запросу потребителя: устаревшие кадры
+    отбрасываются, а не копятся в буфере FFmpeg.
+    """
+
+    def __init__(self, rtsp_url: str, latest_frame: bool = False, reopen_delay: float = 1.0,
+                 decode_mode: str = "color"):
+        self.set_decode_mode(decode_mode)
         self.rtsp_url = rtsp_url
+        self.latest_frame = latest_frame
+        self.reopen_delay = reopen_delay
         self.cap = cv2.VideoCapture(self.rtsp_url)
+        self._lock = threading.Lock()
+        self._grab_seq = 0  # Номер последнего захваченного grab() кадра
+        self._grab_time = 0.0
+        self._retrieved_seq = 0  # Номер кадра, для которого уже выполнен retrieve()
+        self._last_frame: Optional[np.ndarray] = None
+        self._running = False
+        self._grab_thread: Optional[threading.Thread] = None
+        if self.latest_frame:
+            self.start()
+
+    def start(self) -> None:
+        """
+        Запускает фоновый поток захвата кадров.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._grab_thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self._grab_thread.start()
+
+    def stop(self) -> None:
+        """
+        Останавливает фоновый поток захвата кадров.
+        """
+        self._running = False
+        if self._grab_thread is not None:
+            self._grab_thread.join(timeout=2)
+            self._grab_thread = None
+
+    def _grab_loop(self) -> None:
+        while self._running:
+            with self._lock:
+                if not self.cap.isOpened():
+                    self.cap.open(self.rtsp_url)
+                ok = self.cap.isOpened() and self.cap.grab()
+                if ok:
+                    self._grab_seq += 1
+                    self._grab_time = time.time()
+                    self.metrics.on_received()
+            if not ok:
+                time.sleep(self.reopen_delay)
+
+    def get_stamped_frame(self) -> Optional[CameraFrame]:
+        if not self.latest_frame:
+            return super().get_stamped_frame()
+        with self._lock:
+            if self._grab_seq == 0:
+                return None
+            if self._grab_seq != self._retrieved_seq:
+                started = time.perf_counter()
+                ret, frame = self.cap.retrieve()
+                if not ret:
+                    self.metrics.on_partial()
+                    return None
+                self.metrics.on_decoded(time.perf_counter() - started)
+                # Захваченные, но так и не извлечённые кадры отброшены как устаревшие
+                self.metrics.on_dropped(self._grab_seq - self._retrieved_seq - 1)
+                self._last_frame = self.apply_decode_mode(frame)
+                self._retrieved_seq = self._grab_seq
+            self.metrics.on_consumed(self._grab_time)
+            return CameraFrame(self._last_frame, self._grab_time, self._retrieved_seq, self.decode_scale)
 
     def get_cv_frame(self) -> np.ndarray:
+        if self.latest_frame:
+            stamped = self.get_stamped_frame()
+            return stamped.image if stamped is not None else None
         if not self.cap.isOpened():
             self.cap.open(self.rtsp_url)
+        started = time.perf_counter()
         ret, frame = self.cap.read()
         if ret:
-            return frame
+            self.metrics.on_received()
+            self.metrics.on_decoded(time.perf_counter() - started)
+            return self.apply_decode_mode(frame)
         else:
             return None
 
+    # Интерфейс, совместимый с cv2.VideoCapture, чтобы камеру можно было
+    # передавать в detect_qr_global и move_to_target вместо cap.
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        frame = self.get_cv_frame()
+        return frame is not None, frame
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def get(self, prop_id: int) -> float:
+        return self.cap.get(prop_id)
+
     def release(self):
-        if self.cap.isOpened():
-            self.cap.release()
+        self.stop()
+        with self._lock:
+            if self.cap.isOpened():
+                self.cap.release()
+
+
+class JpegReassembler:
+    """
+    Склеивает JPEG кадры, разбитые на несколько последовательных UDP датаграмм.
+    Незавершённый кадр отбрасывается, если в датаграмме раньше EOI встречается новый SOI
+    (сборка продолжается с него) или если размер промежуточного буфера превышает max_frame_size.
+    """
+
+    def __init__(self, max_frame_size: int = 1 << 20):
+        self.max_frame_size = max_frame_size
+        self._staging = bytearray()
+        self._in_frame = False
+        self.frames_completed = 0
+        self.frames_abandoned = 0
+
+    def reset(self) -> None:
+        if self._in_frame:
+            self.frames_abandoned += 1
+        self._staging.clear()
+        self._in_frame = False
+
+    def feed(self, data: Union[bytes, bytearray], size: Optional[int] = None) -> List[Union[memoryview, bytes]]:
+        """
+        Принимает очередную датаграмму (первые size байт data) и возвращает список кадров,
+        завершённых ею. Кадр, целиком лежащий в одной датаграмме, возвращается как memoryview
+        на data без копирования; склеенный из нескольких датаграмм - как bytes.
+        """
+        frames = []
+        pos = 0
+        size = len(data) if size is None else size
+        view = memoryview(data)
+        while pos < size:
+            if not self._in_frame:
+                beginning = data.find(JPEG_SOI, pos, size)
+                if beginning == -1:
+                    break
+                end = data.find(JPEG_EOI, beginning + 2, size)
+                if end != -1:
+                    # Кадр целиком в одной датаграмме
+                    frames.append(view[beginning:end + 2])
+                    self.frames_completed += 1
+                    pos = end + 2
+                    continue
+                self._staging += view[beginning:size]
+                self._in_frame = True
+                break
+            # EOI может оказаться на границе датаграмм, поэтому ищем с последнего байта буфера
+            search_from = len(self._staging) - 1
+            offset = len(self._staging) - pos  # Индекс в буфере = индекс в data + offset
+            beginning = data.find(JPEG_SOI, pos, size)
+            self._staging += view[pos:size]
+            end = self._staging.find(JPEG_EOI, search_from)
+            if beginning != -1 and (end == -1 or end - offset > beginning):
+                # Новый кадр начался раньше, чем закончился предыдущий: собираем с нового SOI
+                self.reset()
+                pos = beginning
+                continue
+            if end == -1:
+                if len(self._staging) > self.max_frame_size:
+                    self.reset()
+                break
+            frames.append(bytes(self._staging[:end + 2]))
+            self.frames_completed += 1
+            pos = size - (len(self._staging) - (end + 2))
+            self._staging.clear()
+            self._in_frame = False
+        return frames
+
+    def stats(self) -> dict:
+        return {"frames_completed": self.frames_completed, "frames_abandoned": self.frames_abandoned}
 
 
 class SocketCamera(BaseCamera):
+    """
+    Камера, принимающая JPEG кадры по UDP. Датаграммы читаются через recv_into в пул
+    заранее выделенных буферов, накопившиеся в сокете датаграммы вычитываются пачкой и
+    декодируется только самый свежий кадр. Если содержимое кадра совпадает с предыдущим
+    (по crc32), повторное декодирование пропускается и возвращается копия прошлого результата.
+    Новые кадры отдаются без копирования; собственная копия для такого пропуска хранится,
+    только пока поток повторяет кадры.
+
+    Подключение - конечный автомат disconnected -> connected -> backoff: после неудачного
+    подключения или потери потока (нет кадров дольше stale_timeout) следующая попытка
+    выполняется не раньше, чем через экспоненциально растущую задержку, а до тех пор
+    get_frame сразу возвращает None, не блокируя цикл детекции. Для приёма нескольких камер
+    в одном потоке подключение можно выполнить без блокировки: begin_connect и finish_connect
+    (состояние connecting).
+    """
+
+    STATE_DISCONNECTED = "disconnected"
+    STATE_CONNECTED = "connected"
+    STATE_BACKOFF = "backoff"
+    STATE_CONNECTING = "connecting"
+
     def __init__(self, ip: str, port: int, timeout: float = 0.5, video_buffer_size: int = 65000,
-                 log_connection: bool = True):
+                 log_connection: bool = True, max_frame_size: int = 1 << 20, buffer_pool_size: int = 4,
+                 max_drain: int = 64, decode_mode: str = "color", reconnect_delay: float = 0.5,
+                 max_reconnect_delay: float = 10.0, stale_timeout: float = 5.0, log_interval: float = 5.0):
+        self.set_decode_mode(decode_mode)
         self.ip = ip
         self.port = port
         self.timeout = timeout
@@ -43,7 +338,27 @@ class SocketCamera(BaseCamera):
         self.tcp = None
         self.udp = None
         self.connected = False
-        self._video_frame_buffer = bytes()
+        self.max_drain = max_drain
+        self.reassembler = JpegReassembler(max_frame_size)
+        self._buffer_pool = [bytearray(video_buffer_size) for _ in range(max(2, buffer_pool_size))]
+        self._buffer_index = 0
+        self._last_checksum: Optional[Tuple[int, str]] = None
+        self._last_image: Optional[np.ndarray] = None  # Собственная копия, вызывающему не отдаётся
+        self._repeating = False  # Последний кадр повторял предыдущий
+        self.identical_frames_skipped = 0
+        self.last_receive_time = 0.0  # Время приёма последнего собранного кадра
+        self.recorder = None  # FlightRecorder для записи сырых JPEG кадров
+        self.state = self.STATE_DISCONNECTED
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.stale_timeout = stale_timeout
+        self.log_interval = log_interval
+        self.reconnect_attempts = 0
+        self._current_delay = reconnect_delay
+        self._next_attempt_time = 0.0
+        self._connect_deadline = 0.0
+        self._connected_time = 0.0
+        self._log_times = {}  # Ключ сообщения -> (время последнего вывода, подавлено сообщений)
 
     def new_tcp(self):
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -57,23 +372,134 @@ class SocketCamera(BaseCamera):
         sock.settimeout(self.timeout)
         return sock
 
-    def connect(self):
+    def log_limited(self, key: str, message: str) -> None:
+        # Одно и то же сообщение печатается не чаще раза в log_interval секунд
+        if not self.log_connection:
+            return
+        now = time.time()
+        last_time, suppressed = self._log_times.get(key, (0.0, 0))
+        if now - last_time < self.log_interval:
+            self._log_times[key] = (last_time, suppressed + 1)
+            return
+        if suppressed:
+            message = f"{message} (ещё {suppressed} таких сообщений подавлено)"
+        print(f"SocketCamera {self.ip}:{self.port} {message}")
+        self._log_times[key] = (now, 0)
+
+    def connect(self) -> bool:
         self.disconnect()
         self.tcp = self.new_tcp()
         self.udp = self.new_udp()
+        self.reconnect_attempts += 1
         try:
             self.tcp.connect((self.ip, self.port))
-            self.udp.bind(self.tcp.getsockname())
-            self.connected = True
-            if self.log_connection:
-                print("SocketCamera CONNECTED")
+            self._on_connected()
+        except Exception as e:
+            self._on_connect_failed(e)
+        return self.connected
+
+    def _on_connected(self) -> None:
+        self.udp.bind(self.tcp.getsockname())
+        self.connected = True
+        self.state = self.STATE_CONNECTED
+        self._current_delay = self.reconnect_delay
+        self._connected_time = time.time()
+        self.log_limited("connected", "CONNECTED")
+
+    def _on_connect_failed(self, error) -> None:
+        self.log_limited("connect_failed", f"connection failed: {error}")
+        self.schedule_reconnect()
+
+    def begin_connect(self) -> Optional[socket.socket]:
+        """
+        Начинает неблокирующее подключение, если камера не подключена и задержка после прошлой
+        неудачи истекла. Когда возвращённый TCP сокет станет готов к записи, нужно вызвать
+        finish_connect; если этого не случилось до connect_timed_out, - abort_connect.
+
+        :return: TCP сокет, ожидающий подключения, или None.
+        :rtype: Optional[socket.socket]
+        """
+        if self.connected or self.state == self.STATE_CONNECTING or time.time() < self._next_attempt_time:
+            return None
+        self.disconnect()
+        self.tcp = self.new_tcp()
+        self.udp = self.new_udp()
+        self.tcp.setblocking(False)
+        self.reconnect_attempts += 1
+        error = self.tcp.connect_ex((self.ip, self.port))
+        if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            self._on_connect_failed(os.strerror(error))
+            return None
+        self.state = self.STATE_CONNECTING
+        self._connect_deadline = time.time() + self.timeout
+        return self.tcp
+
+    def finish_connect(self) -> bool:
+        """
+        Завершает подключение, начатое begin_connect, после готовности TCP сокета к записи.
+
+        :return: True, если камера подключена.
+        :rtype: bool
+        """
+        if self.state != self.STATE_CONNECTING:
+            return self.connected
+        error = self.tcp.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        try:
+            if error:
+                raise OSError(error, os.strerror(error))
+            self.tcp.settimeout(self.timeout)
+            self._on_connected()
         except Exception as e:
-            if self.log_connection:
-                print("SocketCamera connection failed:", e)
-            self.connected = False
+            self._on_connect_failed(e)
+        return self.connected
+
+    def connect_timed_out(self) -> bool:
+        return self.state == self.STATE_CONNECTING and time.time() > self._connect_deadline
+
+    def abort_connect(self) -> None:
+        self._on_connect_failed("timed out")
+
+    def schedule_reconnect(self) -> None:
+        self.disconnect()
+        self.state = self.STATE_BACKOFF
+        self._next_attempt_time = time.time() + self._current_delay
+        self._current_delay = min(self._current_delay * 2, self.max_reconnect_delay)
+
+    def try_reconnect(self) -> bool:
+        """
+        Подключается, если камера не подключена и задержка после прошлой неудачи истекла.
+
+        :return: True, если камера подключена.
+        :rtype: bool
+        """
+        if self.connected:
+            return True
+        if time.time() < self._next_attempt_time:
+            return False
+        return self.connect()
+
+    def check_stale(self) -> bool:
+        """
+        Переводит камеру в ожидание переподключения, если кадров нет дольше stale_timeout.
+
+        :return: True, если поток признан потерянным.
+        :rtype: bool
+        """
+        if not self.connected:
+            return False
+        if time.time() - max(self.last_receive_time, self._connected_time) <= self.stale_timeout:
+            return False
+        self.log_limited("stale", f"нет кадров дольше {self.stale_timeout} с, переподключение")
+        self.schedule_reconnect()
+        return True
 
     def disconnect(self):
         self.connected = False
+        self.state = self.STATE_DISCONNECTED
+        self.reassembler.reset()
+        self._last_checksum = None
+        self._last_image = None
+        self._repeating = False
         if self.tcp:
             self.tcp.close()
             self.tcp = None
@@ -81,30 +507,299 @@ class SocketCamera(BaseCamera):
             self.udp.close()
             self.udp = None
 
-    def get_frame(self) -> bytes:
-        try:
-            if not self.connected:
-                self.connect()
-            self._video_frame_buffer, addr = self.udp.recvfrom(self.video_buffer_size)
-            beginning = self._video_frame_buffer.find(b'\xff\xd8')
-            if beginning == -1:
-                return None
-            self._video_frame_buffer = self._video_frame_buffer[beginning:]
-            end = self._video_frame_buffer.find(b'\xff\xd9')
-            if end == -1:
+    def _next_buffer(self, pinned: int) -> int:
+        # Следующий буфер пула, не занятый последним готовым кадром
+        self._buffer_index = (self._buffer_index + 1) % len(self._buffer_pool)
+        if self._buffer_index == pinned:
+            self._buffer_index = (self._buffer_index + 1) % len(self._buffer_pool)
+        return self._buffer_index
+
+    def _receive_latest(self, blocking: bool = True) -> Optional[Union[memoryview, bytes]]:
+        """
+        Принимает датаграмму (блокирующе или только если она уже пришла), затем без ожидания
+        вычитывает остальные пришедшие и возвращает самый свежий собранный кадр (или None).
+        """
+        if not blocking:
+            readable, _, _ = select.select([self.udp], [], [], 0)
+            if not readable:
                 return None
-            return self._video_frame_buffer[:end + 2]
+        latest = None
+        pinned = -1
+        index = self._next_buffer(pinned)
+        size = self.udp.recv_into(self._buffer_pool[index])
+        for _ in range(self.max_drain):
+            frames = self.reassembler.feed(self._buffer_pool[index], size)
+            if frames:
+                self.metrics.on_received(len(frames))
+                if latest is not None:
+                    self.metrics.on_dropped()
+                self.metrics.on_dropped(len(frames) - 1)
+                latest = frames[-1]
+                self.last_receive_time = time.time()
+                pinned = index if isinstance(latest, memoryview) else -1
+            readable, _, _ = select.select([self.udp], [], [], 0)
+            if not readable:
+                break
+            index = self._next_buffer(pinned)
+            size = self.udp.recv_into(self._buffer_pool[index])
+        if latest is not None and self.recorder is not None:
+            self.recorder.record_frame(latest, self.last_receive_time)
+        return latest
+
+    def get_frame_view(self) -> Optional[Union[memoryview, bytes]]:
+        """
+        Возвращает JPEG кадр без копирования. memoryview остаётся валидным
+        только до следующего вызова приёма кадра.
+        """
+        if not self.try_reconnect():
+            return None  # Идёт ожидание переподключения - кадра нет, но и блокировки нет
+        try:
+            return self._receive_latest()
+        except socket.timeout:
+            self.check_stale()
+            return None
         except Exception as e:
-            if self.log_connection:
-                print("SocketCamera get_frame error:", e)
+            self.log_limited("receive_error", f"get_frame error: {e}")
+            self.schedule_reconnect()
+            return None
+
+    def get_frame(self) -> bytes:
+        frame_view = self.get_frame_view()
+        if frame_view is None:
             return None
+        return bytes(frame_view)
+
+    def get_stamped_frame(self) -> Optional[CameraFrame]:
+        # Кадр помечается временем приёма датаграммы, а не временем окончания декодирования
+        frame = self.get_cv_frame()
+        if frame is None:
+            return None
+        self._stamped_seq = getattr(self, "_stamped_seq", 0) + 1
+        return CameraFrame(frame, self.last_receive_time, self._stamped_seq, self.decode_scale)
+
+    def poll_frame_view(self) -> Optional[Union[memoryview, bytes]]:
+        """
+        Неблокирующий вариант get_frame_view для подключённой камеры: вычитывает только
+        уже пришедшие датаграммы и возвращает самый свежий JPEG кадр без декодирования.
+        """
+        if not self.connected:
+            return None
+        return self._receive_latest(blocking=False)
+
+    def poll_cv_frame(self) -> Optional[np.ndarray]:
+        """
+        Неблокирующий вариант get_cv_frame для подключённой камеры: вычитывает только
+        уже пришедшие датаграммы и декодирует самый свежий кадр. Если кадра нет, возвращает None.
+        """
+        return self.decode_frame_view(self.poll_frame_view())
 
     def get_cv_frame(self) -> np.ndarray:
-        frame_bytes = self.get_frame()
-        if frame_bytes is not None:
-            frame = cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
-            return frame
-        return None
+        return self.decode_frame_view(self.get_frame_view())
+
+    def decode_frame_view(self, frame_view: Optional[Union[memoryview, bytes]]) -> Optional[np.ndarray]:
+        if frame_view is None:
+            return None
+        checksum = (zlib.crc32(frame_view), self.decode_mode)
+        repeated = checksum == self._last_checksum
+        if repeated and self._last_image is not None:
+            # Тот же самый JPEG - декодировать повторно незачем
+            self.identical_frames_skipped += 1
+            self.metrics.on_decode_skipped()
+            self.metrics.on_consumed(self.last_receive_time)
+            # Копия: вызывающий может рисовать на кадре, а кэш должен остаться нетронутым
+            return self._last_image.copy()
+        frame = self.decode_jpeg(frame_view)
+        self._last_checksum = checksum if frame is not None else None
+        # Вызывающий получает декодированный кадр без копирования. Копия для пропуска повторов
+        # делается, только если поток начал повторять кадры, иначе она не понадобится
+        self._repeating = repeated or (self._repeating and frame is not None)
+        self._last_image = frame.copy() if frame is not None and self._repeating else None
+        if frame is not None:
+            self.metrics.on_consumed(self.last_receive_time)
+        return frame
+
+    def metrics_snapshot(self) -> dict:
+        # Незавершённые кадры - это и брошенные сборщиком, и не декодировавшиеся
+        return self.metrics.snapshot({
+            "frames_partial": self.metrics.frames_partial + self.reassembler.frames_abandoned,
+            "frames_abandoned": self.reassembler.frames_abandoned,
+        })
+
+
+class ReplayCamera(BaseCamera):
+    """
+    Камера, воспроизводящая записанные кадры для офлайн прогонов детекции.
+    Источник - папка с изображениями (проигрываются по имени файла с частотой fps)
+    или последовательность пар (время записи, JPEG bytes).
+
+    В режиме realtime кадры выдаются с исходными интервалами, иначе - так быстро,
+    как их забирает потребитель (для замера пропускной способности конвейера).
+    """
+
+    IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, source: Union[str, Iterable[Tuple[float, bytes]]], fps: float = 30.0,
+                 realtime: bool = True, loop: bool = False, decode_mode: str = "color"):
+        self.set_decode_mode(decode_mode)
+        self.realtime = realtime
+        self.loop = loop
+        if isinstance(source, str):
+            names = sorted(name for name in os.listdir(source) if name.lower().endswith(self.IMAGE_EXTENSIONS))
+            self._entries = [(i / fps, os.path.join(source, name)) for i, name in enumerate(names)]
+        else:
+            self._entries = list(source)
+        self._index = 0
+        self._start_wall: Optional[float] = None
+        self._start_recorded = 0.0
+        self.frames_played = 0
+        self.recorded_timestamp: Optional[float] = None  # Время записи последнего выданного кадра
+        self._frame_size: Optional[Tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.loop and self._index >= len(self._entries)
+
+    def reset(self) -> None:
+        self._index = 0
+        self._start_wall = None
+
+    @staticmethod
+    def _load(payload: Union[str, bytes]) -> bytes:
+        if isinstance(payload, str):
+            with open(payload, "rb") as file:
+                return file.read()
+        return payload
+
+    def get_stamped_frame(self) -> Optional[CameraFrame]:
+        if not self._entries:
+            return None
+        if self._index >= len(self._entries):
+            if not self.loop:
+                return None
+            self.reset()
+        recorded, payload = self._entries[self._index]
+        self._index += 1
+        self.metrics.on_received()
+        if self.realtime:
+            if self._start_wall is None:
+                self._start_wall = time.time()
+                self._start_recorded = recorded
+            delay = self._start_wall + (recorded - self._start_recorded) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        frame = self.decode_jpeg(self._load(payload))
+        if frame is None:
+            return None
+        self.frames_played += 1
+        self.recorded_timestamp = recorded
+        if self._frame_size is None:
+            self._frame_size = (int(frame.shape[1] / self.decode_scale), int(frame.shape[0] / self.decode_scale))
+        return CameraFrame(frame, time.time(), self.frames_played, self.decode_scale)
 
+    def get_cv_frame(self) -> np.ndarray:
+        stamped = self.get_stamped_frame()
+        return stamped.image if stamped is not None else None
+
+    # Интерфейс, совместимый с cv2.VideoCapture (как у RTSPCamera)
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        frame = self.get_cv_frame()
+        return frame is not None, frame
+
+    def isOpened(self) -> bool:
+        return not self.exhausted
+
+    def get(self, prop_id: int) -> float:
+        if self._frame_size is None and self._entries:
+            frame = self.decode_jpeg(self._load(self._entries[0][1]))
+            if frame is not None:
+                self._frame_size = (int(frame.shape[1] / self.decode_scale),
+                                    int(frame.shape[0] / self.decode_scale))
+        if self._frame_size is None:
+            return 0.0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._frame_size[0])
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._frame_size[1])
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self._entries))
+        return 0.0
+
+    def release(self):
+        self._index = len(self._entries)
+        self.loop = False
+
+
+class DecodePool:
+    """
+    Общий пул потоков для декодирования JPEG кадров нескольких камер. cv2.imdecode
+    отпускает GIL, поэтому декодирование кадров 4-8 дронов идёт параллельно на разных ядрах.
+    """
+
+    def __init__(self, workers: int = 4):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jpeg-decode")
+
+    def submit(self, camera: BaseCamera, payload: bytes) -> Future:
+        return self._executor.submit(camera.decode_jpeg, payload)
+
+    def ordered(self, camera: BaseCamera, callback: Callable[[CameraFrame], None],
+                max_in_flight: int = 2) -> "OrderedDecoder":
+        return OrderedDecoder(self, camera, callback, max_in_flight)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class OrderedDecoder:
+    """
+    Поток декодирования одной камеры через DecodePool. Кадры декодируются параллельно,
+    но callback получает их строго в порядке поступления (вызывается в потоке пула).
+    Если в работе уже max_in_flight кадров, самый старый ещё не начатый кадр отменяется.
+    """
+
+    def __init__(self, pool: DecodePool, camera: BaseCamera, callback: Callable[[CameraFrame], None],
+                 max_in_flight: int = 2):
+        self.pool = pool
+        self.camera = camera
+        self.callback = callback
+        self.max_in_flight = max_in_flight
+        self._pending = deque()  # (future, timestamp, seq)
+        # RLock: отмена future внутри push синхронно вызывает _flush в том же потоке
+        self._lock = threading.RLock()
+        self._seq = 0
+
+    def push(self, payload: Union[memoryview, bytes], timestamp: float) -> None:
+        """
+        Отправляет JPEG кадр на декодирование. memoryview копируется, т.к. буфер приёма переиспользуется.
+        """
+        with self._lock:
+            if len(self._pending) >= self.max_in_flight:
+                for future, _, _ in self._pending:
+                    if future.cancel():
+                        self.camera.metrics.on_dropped()
+                        break
+            self._seq += 1
+            future = self.pool.submit(self.camera, bytes(payload))
+            self._pending.append((future, timestamp, self._seq))
+        future.add_done_callback(self._flush)
 
+    def _flush(self, _future: Future) -> None:
+        ready = []
+        with self._lock:
+            while self._pending and self._pending[0][0].done():
+                future, timestamp, seq = self._pending.popleft()
+                if future.cancelled() or future.exception() is not None:
+                    continue
+                frame = future.result()
+                if frame is not None:
+                    ready.append(CameraFrame(frame, timestamp, seq, self.camera.decode_scale))
+            # Колбэк вызывается под блокировкой, чтобы кадры не обгоняли друг друга
+            for packet in ready:
+                self.callback(packet)
 
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
@@ -0,0 +1,218 @@
+import queue
+import selectors
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from .drone_cv import CameraFrame, DecodePool, SocketCamera
+
+
+class _FleetStream:
+    def __init__(self, name: str, camera: SocketCamera,
+                 callback: Optional[Callable[[str, CameraFrame], None]], maxsize: int):
+        self.name = name
+        self.camera = camera
+        self.callback = callback
+        self.frames: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.udp = None  # Сокет, зарегистрированный в селекторе
+        self.connecting = None  # TCP сокет неблокирующего подключения, ожидающий готовности на запись
+        self.seq = 0
+        self.decoder = None  # OrderedDecoder, если декодирование идёт в DecodePool
+
+
+class FleetCameraReceiver:
+    """
+    Приём видеопотоков всех дронов в одном потоке. UDP сокеты всех SocketCamera
+    мультиплексируются через selectors (epoll/kqueue/select), чтение неблокирующее,
+    поэтому пропавшая датаграмма одного дрона не задерживает остальных.
+
+    Кадры доставляются в колбэк callback(name, CameraFrame) и/или в очередь дрона,
+    в которой хранятся только самые свежие кадры. Камеры переподключаются с экспоненциальной
+    задержкой; TCP подключение неблокирующее (SocketCamera.begin_connect) и ждётся в том же
+    селекторе, поэтому недоступный дрон не задерживает приём остальных.
+
+    С decode_pool цикл приёма только вычитывает JPEG, а декодирование кадров всех дронов
+    идёт параллельно в пуле; колбэки тогда вызываются из потоков пула.
+    """
+
+    def __init__(self, select_timeout: float = 0.1, decode_pool: Optional[DecodePool] = None):
+        self.select_timeout = select_timeout
+        self.decode_pool = decode_pool
+        self._selector = selectors.DefaultSelector()
+        self._streams: Dict[str, _FleetStream] = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def add_camera(self, name: str, camera: SocketCamera,
+                   callback: Optional[Callable[[str, CameraFrame], None]] = None,
+                   maxsize: int = 1) -> queue.Queue:
+        """
+        Добавляет камеру в приёмник.
+
+        :param name: Имя потока (например, "scout_0").
+        :type name: str
+        :param camera: Камера дрона.
+        :type camera: SocketCamera
+        :param callback: Функция callback(name, CameraFrame), вызываемая в потоке приёмника.
+        :type callback: Optional[Callable[[str, CameraFrame], None]]
+        :param maxsize: Сколько последних кадров хранить в очереди.
+        :type maxsize: int
+        :return: Очередь кадров этого дрона.
+        :rtype: queue.Queue
+        """
+        with self._lock:
+            if name in self._streams:
+                raise ValueError(f"Камера {name} уже добавлена")
+            stream = _FleetStream(name, camera, callback, maxsize)
+            if self.decode_pool is not None:
+                stream.decoder = self.decode_pool.ordered(camera, lambda packet, s=stream: self._publish(s, packet))
+            self._streams[name] = stream
+        return stream.frames
+
+    def add_drones(self, drones: List[dict], prefix: str = "drone",
+                   callback: Optional[Callable[[str, CameraFrame], None]] = None,
+                   **camera_kwargs) -> Dict[str, queue.Queue]:
+        """
+        Добавляет камеры по описаниям дронов из CompetitionConfig
+        (словари с ключами "id", "ip", "camera_port").
+
+        :return: Словарь очередей кадров по именам вида "{prefix}_{id}".
+        :rtype: Dict[str, queue.Queue]
+        """
+        queues = {}
+        for drone_info in drones:
+            if "camera_port" not in drone_info:
+                continue
+            name = f"{prefix}_{drone_info['id']}"
+            camera = SocketCamera(ip=drone_info["ip"], port=drone_info["camera_port"], **camera_kwargs)
+            queues[name] = self.add_camera(name, camera, callback)
+        return queues
+
+    def remove_camera(self, name: str) -> None:
+        with self._lock:
+            stream = self._streams.pop(name, None)
+        if stream is not None:
+            self._unregister(stream)
+            stream.camera.disconnect()
+
+    def camera(self, name: str) -> SocketCamera:
+        return self._streams[name].camera
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        with self._lock:
+            streams = list(self._streams.values())
+        for stream in streams:
+            self._unregister(stream)
+            stream.camera.disconnect()
+
+    def _loop(self) -> None:
+        while self._running:
+            self.run_once()
+
+    def _unregister(self, stream: _FleetStream) -> None:
+        for sock in (stream.udp, stream.connecting):
+            if sock is not None:
+                try:
+                    self._selector.unregister(sock)
+                except (KeyError, ValueError):
+                    pass
+        stream.udp = None
+        stream.connecting = None
+
+    def _ensure_connected(self, stream: _FleetStream) -> None:
+        camera = stream.camera
+        camera.check_stale()
+        if camera.connected and camera.udp is stream.udp:
+            return
+        if stream.connecting is not None:
+            if camera.connect_timed_out():
+                self._unregister(stream)
+                camera.abort_connect()
+            return
+        self._unregister(stream)
+        if camera.connected:
+            self._register_udp(stream)
+            return
+        sock = camera.begin_connect()
+        if sock is not None:
+            stream.connecting = sock
+            self._selector.register(sock, selectors.EVENT_WRITE, stream)
+
+    def _register_udp(self, stream: _FleetStream) -> None:
+        stream.udp = stream.camera.udp
+        self._selector.register(stream.udp, selectors.EVENT_READ, stream)
+
+    def _finish_connect(self, stream: _FleetStream) -> None:
+        self._unregister(stream)
+        if stream.camera.finish_connect():
+            self._register_udp(stream)
+
+    def _deliver(self, stream: _FleetStream, frame) -> None:
+        stream.seq += 1
+        self._publish(stream, CameraFrame(frame, stream.camera.last_receive_time, stream.seq,
+                                          stream.camera.decode_scale))
+
+    def _publish(self, stream: _FleetStream, packet: CameraFrame) -> None:
+        if stream.frames.full():
+            try:
+                stream.frames.get_nowait()  # Устаревший кадр вытесняется новым
+                stream.camera.metrics.on_dropped()
+            except queue.Empty:
+                pass
+        stream.frames.put_nowait(packet)
+        if stream.callback is not None:
+            stream.callback(stream.name, packet)
+
+    def run_once(self, timeout: Optional[float] = None) -> int:
+        """
+        Одна итерация цикла приёма: переподключает отвалившиеся камеры, ждёт готовые
+        сокеты и раздаёт свежие кадры.
+
+        :param timeout: Время ожидания готовых сокетов (по умолчанию select_timeout).
+        :type timeout: Optional[float]
+        :return: Количество доставленных (или отправленных на декодирование) кадров.
+        :rtype: int
+        """
+        with self._lock:
+            streams = list(self._streams.values())
+        for stream in streams:
+            self._ensure_connected(stream)
+        if not self._selector.get_map():
+            time.sleep(self.select_timeout if timeout is None else timeout)
+            return 0
+        delivered = 0
+        events = self._selector.select(self.select_timeout if timeout is None else timeout)
+        for key, _ in events:
+            stream = key.data
+            if key.fileobj is stream.connecting:
+                self._finish_connect(stream)
+                continue
+            try:
+                if stream.decoder is not None:
+                    frame_view = stream.camera.poll_frame_view()
+                    if frame_view is not None:
+                        stream.decoder.push(frame_view, stream.camera.last_receive_time)
+                        delivered += 1
+                    continue
+                frame = stream.camera.poll_cv_frame()
+            except OSError as e:
+                stream.camera.log_limited("receive_error", f"ошибка приёма: {e}")
+                self._unregister(stream)
+                stream.camera.schedule_reconnect()
+                continue
+            if frame is not None:
+                self._deliver(stream, frame)
+                delivered += 1
+        return delivered
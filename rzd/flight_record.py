@@ -0,0 +1,205 @@
+import json
+import mmap
+import os
+import queue
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .telemetry import TelemetryRecorder
+
+# Типы записей
+RECORD_FRAME = 0  # Сырой JPEG кадр в том виде, в каком его принял SocketCamera
+RECORD_DETECTION = 1  # Результат детекции в JSON
+
+# Запись индекса фиксированной ширины: где лежат данные, когда и в какой позе они получены
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),
+    ("length", "<u4"),
+    ("kind", "<u1"),
+    ("camera", "<u1"),
+    ("reserved", "<u2"),
+    ("timestamp", "<f8"),
+    ("pose", "<f4", (4,)),  # x, y, z, yaw (NaN, если поза неизвестна)
+])
+
+
+def _record_paths(path: str) -> Tuple[str, str]:
+    return path + ".dat", path + ".idx"
+
+
+class FlightRecorder:
+    """
+    Запись полёта в контейнер из двух файлов: path.dat - данные, дописываемые подряд
+    без перекодирования, и path.idx - индекс с записями фиксированной ширины INDEX_DTYPE.
+    Запись на диск выполняет фоновый поток, поэтому record_* не задерживают цикл управления.
+    """
+
+    def __init__(self, path: str, telemetry: Optional[TelemetryRecorder] = None, max_queue: int = 256):
+        self.path = path
+        self.telemetry = telemetry
+        data_path, index_path = _record_paths(path)
+        self._data = open(data_path, "ab")
+        self._index = open(index_path, "ab")
+        self._offset = self._data.tell()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.records_written = 0
+        self.records_dropped = 0
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def _pose(self, pose) -> np.ndarray:
+        if pose is None and self.telemetry is not None:
+            latest = self.telemetry.latest()
+            pose = latest[1:] if latest is not None else None
+        if pose is None:
+            return np.full(4, np.nan, dtype=np.float32)
+        return np.asarray(pose, dtype=np.float32)[:4]
+
+    def _put(self, kind: int, payload: bytes, timestamp: Optional[float], pose, camera: int) -> None:
+        timestamp = time.time() if timestamp is None else timestamp
+        try:
+            self._queue.put_nowait((kind, payload, timestamp, self._pose(pose), camera))
+        except queue.Full:
+            # Диск не успевает: теряем запись, но не тормозим управление
+            self.records_dropped += 1
+
+    def record_frame(self, payload: Union[bytes, memoryview], timestamp: Optional[float] = None,
+                     pose=None, camera: int = 0) -> None:
+        """
+        Ставит в очередь записи сырой JPEG кадр.
+
+        :param payload: JPEG данные (memoryview копируется, т.к. буфер приёма переиспользуется).
+        :param timestamp: Время приёма кадра.
+        :type timestamp: Optional[float]
+        :param pose: Поза [x, y, z, yaw]; по умолчанию последняя из telemetry.
+        :param camera: Номер камеры в записи.
+        :type camera: int
+        """
+        self._put(RECORD_FRAME, bytes(payload), timestamp, pose, camera)
+
+    def record_detection(self, detection: dict, timestamp: Optional[float] = None,
+                         pose=None, camera: int = 0) -> None:
+        """
+        Ставит в очередь записи результат детекции (словарь, сериализуемый в JSON).
+        """
+        payload = json.dumps(detection, ensure_ascii=False, default=str).encode("utf-8")
+        self._put(RECORD_DETECTION, payload, timestamp, pose, camera)
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Пишем всё, что накопилось, одной пачкой
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+        self._data.flush()
+        self._index.flush()
+
+    def _write_batch(self, batch: List[tuple]) -> None:
+        entries = np.zeros(len(batch), dtype=INDEX_DTYPE)
+        for i, (kind, payload, timestamp, pose, camera) in enumerate(batch):
+            self._data.write(payload)
+            entries[i] = (self._offset, len(payload), kind, camera, 0, timestamp, pose)
+            self._offset += len(payload)
+        # Индекс пишется только после данных, поэтому читатель всегда видит согласованный префикс
+        self._data.flush()
+        self._index.write(entries.tobytes())
+        self._index.flush()
+        self.records_written += len(batch)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self) -> "FlightRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class FlightReader:
+    """
+    Чтение записи полёта. Файл данных отображается в память (mmap), поэтому любой
+    кадр доступен за O(1) по индексу и возвращается как memoryview без копирования.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        data_path, index_path = _record_paths(path)
+        self.index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+        self._file = open(data_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b"")
+        self.frame_rows = np.flatnonzero(self.index["kind"] == RECORD_FRAME)
+        self.detection_rows = np.flatnonzero(self.index["kind"] == RECORD_DETECTION)
+
+    def __len__(self) -> int:
+        return len(self.frame_rows)
+
+    def _payload(self, row: int) -> memoryview:
+        entry = self.index[row]
+        offset = int(entry["offset"])
+        return self._view[offset:offset + int(entry["length"])]
+
+    def frame(self, i: int) -> Tuple[float, np.ndarray, memoryview]:
+        """
+        Возвращает i-й кадр записи.
+
+        :param i: Номер кадра.
+        :type i: int
+        :return: Кортеж (время приёма, поза [x, y, z, yaw], JPEG данные).
+        :rtype: Tuple[float, np.ndarray, memoryview]
+        """
+        row = self.frame_rows[i]
+        entry = self.index[row]
+        return float(entry["timestamp"]), entry["pose"], self._payload(row)
+
+    def frames(self, camera: Optional[int] = None) -> Iterator[Tuple[float, np.ndarray, memoryview]]:
+        for i, row in enumerate(self.frame_rows):
+            if camera is None or self.index[row]["camera"] == camera:
+                yield self.frame(i)
+
+    def frame_entries(self, camera: Optional[int] = None) -> List[Tuple[float, memoryview]]:
+        """
+        Пары (время, JPEG) для ReplayCamera.
+        """
+        return [(timestamp, payload) for timestamp, _, payload in self.frames(camera)]
+
+    def detections(self) -> Iterator[Tuple[float, np.ndarray, dict]]:
+        for row in self.detection_rows:
+            entry = self.index[row]
+            yield float(entry["timestamp"]), entry["pose"], json.loads(bytes(self._payload(row)))
+
+    def close(self) -> None:
+        try:
+            self._view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            # Кадры записи ещё используются (например, ReplayCamera) - mmap закроется сборщиком мусора
+            pass
+        self._file.close()
+
+    def __enter__(self) -> "FlightReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from .drone_cv import BaseCamera, CameraFrame, DecodePool
+
+
+class FrameSubscription:
+    """
+    Подписка на кадры FrameBus. Хранит не более maxsize последних кадров:
+    если потребитель не успевает, старые кадры вытесняются новыми.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1,
+                 callback: Optional[Callable[[CameraFrame], None]] = None):
+        self.name = name
+        self.callback = callback
+        self.dropped = 0
+        self._frames = deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+
+    def put(self, packet: CameraFrame) -> None:
+        with self._condition:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append(packet)
+            self._condition.notify_all()
+        if self.callback is not None:
+            self.callback(packet)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[CameraFrame]:
+        """
+        Возвращает самый старый из непрочитанных кадров, ожидая его не дольше timeout.
+
+        :param timeout: Время ожидания кадра в секундах (None - ждать бесконечно).
+        :type timeout: Optional[float]
+        :return: Кадр с номером и временем захвата или None, если кадр не пришёл.
+        :rtype: Optional[CameraFrame]
+        """
+        with self._condition:
+            if not self._frames:
+                self._condition.wait(timeout)
+            if not self._frames:
+                return None
+            return self._frames.popleft()
+
+
+class FrameBus:
+    """
+    Единственный читатель камеры дрона. Фоновый поток принимает и декодирует каждый кадр
+    ровно один раз и раздаёт его всем подписчикам (детектор, отображение, запись)
+    с порядковым номером и временем захвата.
+
+    Изображение в CameraFrame общее для всех подписчиков: перед рисованием на нём
+    его нужно скопировать.
+
+    С decode_pool поток чтения только принимает JPEG (для камер с get_frame_view, например
+    SocketCamera), а декодирование идёт в общем пуле; порядок кадров сохраняется.
+    """
+
+    def __init__(self, camera: BaseCamera, name: str = "", idle_delay: float = 0.01,
+                 decode_pool: Optional[DecodePool] = None):
+        self.camera = camera
+        self._decoder = None
+        if decode_pool is not None and hasattr(camera, "get_frame_view"):
+            self._decoder = decode_pool.ordered(camera, self.publish)
+        self.name = name
+        self.idle_delay = idle_delay
+        self.seq = 0
+        self.latest: Optional[CameraFrame] = None
+        self._subscriptions: List[FrameSubscription] = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, name: str, maxsize: int = 1,
+                  callback: Optional[Callable[[CameraFrame], None]] = None) -> FrameSubscription:
+        """
+        Создаёт подписку на кадры.
+
+        :param name: Имя подписчика (для статистики).
+        :type name: str
+        :param maxsize: Сколько последних кадров хранить для подписчика.
+        :type maxsize: int
+        :param callback: Функция, вызываемая в потоке чтения для каждого кадра.
+        :type callback: Optional[Callable[[CameraFrame], None]]
+        :return: Подписка.
+        :rtype: FrameSubscription
+        """
+        subscription = FrameSubscription(name, maxsize, callback)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: FrameSubscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def publish(self, packet: CameraFrame) -> None:
+        """
+        Присваивает кадру номер шины и раздаёт его подписчикам.
+        """
+        self.seq += 1
+        packet = packet._replace(seq=self.seq)
+        self.latest = packet
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.put(packet)
+            except Exception as e:
+                print(f"FrameBus {self.name}: ошибка подписчика {subscription.name}: {e}")
+
+    def _read_loop(self) -> None:
+        while self._running:
+            if self._decoder is not None:
+                self._read_raw()
+                continue
+            try:
+                packet = self.camera.get_stamped_frame()
+            except Exception as e:
+                print(f"FrameBus {self.name}: ошибка чтения камеры: {e}")
+                packet = None
+            if packet is None:
+                time.sleep(self.idle_delay)
+                continue
+            self.publish(packet)
+
+    def _read_raw(self) -> None:
+        try:
+            frame_view = self.camera.get_frame_view()
+        except Exception as e:
+            print(f"FrameBus {self.name}: ошибка чтения камеры: {e}")
+            frame_view = None
+        if frame_view is None:
+            time.sleep(self.idle_delay)
+            return
+        self._decoder.push(frame_view, self.camera.last_receive_time)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            dropped = {f"{s.name}_dropped": s.dropped for s in self._subscriptions}
+        return {"frames_published": self.seq, **dropped}
@@ -0,0 +1,145 @@
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class SceneChangeGate:
+    """
+    Пропуск поиска меток на кадрах, почти не отличающихся от последнего обработанного
+    (дрон висит или стоит на земле). Кадр уменьшается до size, разность с последним
+    обработанным кадром усредняется по блокам block x block, и если разность во всех
+    блоках меньше threshold, поиск пропускается. Сравнивается максимум по блокам, а не
+    среднее по кадру: небольшой код, появившийся в углу кадра, заметно меняет свой блок,
+    но почти не меняет среднее. Раз в force_every кадров кадр обрабатывается в любом случае.
+
+    Шлюз рассчитан на неподвижную камеру: в полёте сцена меняется на каждом кадре.
+    """
+
+    def __init__(self, threshold: float = 8.0, size: Tuple[int, int] = (64, 48), block: int = 4,
+                 force_every: int = 30):
+        """
+        :param threshold: Порог средней по блоку разности яркости (0..255).
+        :type threshold: float
+        :param size: Размер уменьшенного кадра (ширина, высота) для сравнения; кратен block.
+        :type size: Tuple[int, int]
+        :param block: Сторона блока уменьшенного кадра, пикс.
+        :type block: int
+        :param force_every: Через сколько пропущенных кадров обработать кадр принудительно.
+        :type force_every: int
+        """
+        self.threshold = threshold
+        self.size = size
+        self.block = block
+        self.force_every = force_every
+        self.processed = 0
+        self.skipped = 0
+        self.forced = 0
+        self.last_difference = 0.0
+        self._reference: Optional[np.ndarray] = None
+        self._since_processed = 0
+        self._lock = threading.Lock()
+
+    def should_process(self, gray: np.ndarray) -> bool:
+        """
+        Решает, искать ли метки в кадре. Обработанный кадр становится новым эталоном.
+
+        :param gray: Кадр в оттенках серого.
+        :type gray: np.ndarray
+        :return: True, если кадр нужно обработать.
+        :rtype: bool
+        """
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        with self._lock:
+            if self._reference is not None:
+                difference = cv2.absdiff(small, self._reference)
+                blocks = cv2.resize(difference, (self.size[0] // self.block, self.size[1] // self.block),
+                                    interpolation=cv2.INTER_AREA)
+                self.last_difference = float(blocks.max())
+                if self.last_difference < self.threshold:
+                    self._since_processed += 1
+                    if self._since_processed < self.force_every:
+                        self.skipped += 1
+                        return False
+                    self.forced += 1
+            self._reference = small
+            self._since_processed = 0
+            self.processed += 1
+            return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._reference = None
+            self._since_processed = 0
+
+    def stats(self) -> Dict[str, float]:
+        return {"processed": self.processed, "skipped": self.skipped, "forced": self.forced,
+                "last_difference": self.last_difference}
+
+
+class SharpnessGate:
+    """
+    Пропуск смазанных кадров. Резкость - дисперсия лапласиана кадра, уменьшенного до ширины width.
+    Порог адаптивный: кадр считается смазанным, если его резкость меньше ratio от процентиля
+    percentile резкости последних window кадров (и меньше min_sharpness, если он задан).
+    Так на быстром участке пути, где смазаны все кадры, в декодер идут самые резкие из них.
+    """
+
+    def __init__(self, ratio: float = 0.5, window: int = 30, percentile: float = 75.0,
+                 min_sharpness: float = 0.0, width: int = 320):
+        """
+        :param ratio: Доля от типичной резкости, ниже которой кадр пропускается.
+        :type ratio: float
+        :param window: Сколько последних кадров учитывать.
+        :type window: int
+        :param percentile: Процентиль резкости последних кадров, от которого считается порог.
+        :type percentile: float
+        :param min_sharpness: Абсолютный нижний порог резкости.
+        :type min_sharpness: float
+        :param width: Ширина уменьшенного кадра.
+        :type width: int
+        """
+        self.ratio = ratio
+        self.percentile = percentile
+        self.min_sharpness = min_sharpness
+        self.width = width
+        self.passed = 0
+        self.blurred = 0
+        self.last_sharpness = 0.0
+        self.threshold = 0.0
+        self._history = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def sharpness(self, gray: np.ndarray) -> float:
+        scale = min(self.width / gray.shape[1], 1.0)
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+    def should_process(self, gray: np.ndarray) -> bool:
+        """
+        Решает, достаточно ли резок кадр для декодирования.
+
+        :param gray: Кадр в оттенках серого.
+        :type gray: np.ndarray
+        :return: True, если кадр нужно обработать.
+        :rtype: bool
+        """
+        value = self.sharpness(gray)
+        with self._lock:
+            self._history.append(value)
+            self.last_sharpness = value
+            self.threshold = self.ratio * float(np.percentile(self._history, self.percentile))
+            if value < self.threshold or value < self.min_sharpness:
+                self.blurred += 1
+                return False
+            self.passed += 1
+            return True
+
+    def stats(self) -> Dict[str, float]:
+        total = self.passed + self.blurred
+        return {"passed": self.passed, "blurred": self.blurred,
+                "blurred_ratio": self.blurred / total if total else 0.0,
+                "last_sharpness": self.last_sharpness, "threshold": self.threshold}
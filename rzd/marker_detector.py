@@ -0,0 +1,296 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Hashable, List, NamedTuple, Optional, Tuple, Union
+
+import cv2
+import cv2.aruco as aruco
+import numpy as np
+
+from .candidates import CandidatePrefilter, find_qr_candidates
+from .decode_cache import DecodeCache
+from .drone_cv import to_gray
+from .frame_gating import SceneChangeGate, SharpnessGate
+from .qr_backends import QRDecoder, get_default_qr_decoder
+from .retry_ladder import RetryLadder
+
+KIND_QR = "qr"
+KIND_ARUCO = "aruco"
+
+
+class Detection(NamedTuple):
+    kind: str  # KIND_QR или KIND_ARUCO
+    key: str  # Данные QR-кода или "ArUco_{id}"
+    data: Union[str, int]  # Данные QR-кода или id ArUco-метки
+    corners: np.ndarray  # Вершины в пикселях кадра, float32 (N, 2)
+    center: np.ndarray  # Центр вершин (2,)
+    rect: Tuple[int, int, int, int]  # Ограничивающий прямоугольник (x, y, w, h)
+    decode_time: float  # Время работы детектора этого типа, с
+
+
+def _make_detection(kind: str, key: str, data, corners: np.ndarray, decode_time: float) -> Detection:
+    corners = np.asarray(corners, dtype=np.float32).reshape(-1, 2)
+    x0, y0 = corners.min(axis=0)
+    x1, y1 = corners.max(axis=0)
+    rect = (int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+    return Detection(kind, key, data, corners, corners.mean(axis=0), rect, decode_time)
+
+
+def translate_detection(detection: Detection, offset: Tuple[float, float], scale: float = 1.0) -> Detection:
+    """
+    Переводит метку, найденную в вырезке (возможно, масштабированной в scale раз), в координаты кадра.
+
+    :param detection: Метка в координатах вырезки.
+    :type detection: Detection
+    :param offset: Левый верхний угол вырезки в кадре (x, y).
+    :type offset: Tuple[float, float]
+    :param scale: Во сколько раз вырезка была увеличена перед поиском.
+    :type scale: float
+    :return: Метка в координатах кадра.
+    :rtype: Detection
+    """
+    corners = detection.corners / scale + np.asarray(offset, dtype=np.float32)
+    return _make_detection(detection.kind, detection.key, detection.data, corners, detection.decode_time)
+
+
+class MarkerDetector:
+    """
+    Единая точка поиска QR-кодов и ArUco-меток. Кадр один раз переводится в оттенки серого,
+    и это изображение используется обоими детекторами; объекты детекторов создаются один раз.
+    При parallel=True поиск ArUco идёт в отдельном потоке одновременно с декодированием QR
+    (pyzbar и OpenCV отпускают GIL).
+
+    Если передать frame_id (например, CameraFrame.seq), результат для того же кадра
+    берётся из кэша: детектор и отображение не ищут метки в одном кадре дважды.
+
+    QR-коды декодирует decoder (см. qr_backends); если он не задан, используется декодер
+    по умолчанию, выбранный calibrate_qr_decoder / set_default_qr_decoder.
+
+    С cache вырезки-кандидаты (detect_region) не декодируются повторно, пока их содержимое
+    не изменилось: данные берутся из DecodeCache, обновляются только вершины.
+
+    С blur_gate смазанные кадры (SharpnessGate) не декодируются: возвращается пустой список.
+
+    С prefilter кадры без областей-кандидатов (CandidatePrefilter) не передаются декодерам.
+
+    С gate кадры, на которых сцена не изменилась (SceneChangeGate), не обрабатываются:
+    возвращается пустой список, как и для других пропущенных кадров - вершины прошлого кадра
+    не годятся для локализации по текущей позе дрона. Шлюз сцены проверяется после
+    blur_gate и prefilter, поэтому эталоном для сравнения всегда служит декодированный кадр.
+
+    С retry вырезки-кандидаты, которые не удалось декодировать, повторно декодируются
+    после предобработки (RetryLadder) в пределах бюджета времени на кадр. Если декодер
+    не нашёл кодов во всём кадре, с retry декодируются вырезки вокруг кандидатов (decode_qr_candidates).
+    """
+
+    def __init__(self, qr: bool = True, aruco_markers: bool = True,
+                 aruco_dictionary: int = aruco.DICT_4X4_50, parallel: bool = False,
+                 cache: Optional[DecodeCache] = None, decoder: Optional[QRDecoder] = None,
+                 gate: Optional[SceneChangeGate] = None, prefilter: Optional[CandidatePrefilter] = None,
+                 blur_gate: Optional[SharpnessGate] = None, retry: Optional[RetryLadder] = None):
+        self.qr = qr
+        self.retry = retry
+        self.blur_gate = blur_gate
+        self.prefilter = prefilter
+        self.cache = cache
+        self.decoder = decoder
+        self.gate = gate
+        self.aruco_markers = aruco_markers
+        self.parallel = parallel and qr and aruco_markers
+        self.aruco_detector = aruco.ArucoDetector(aruco.getPredefinedDictionary(aruco_dictionary),
+                                                  aruco.DetectorParameters())
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aruco") if self.parallel else None
+        self._cache_lock = threading.Lock()
+        self._cache_id: Optional[Hashable] = None
+        self._cache: List[Detection] = []
+
+    def detect_qr(self, gray: np.ndarray) -> List[Detection]:
+        detections = self.decode_qr(gray)
+        if not detections and self.retry is not None:
+            detections = self.decode_qr_candidates(gray)
+        return detections
+
+    def decode_qr_candidates(self, gray: np.ndarray, width: int = 320, padding: float = 0.25,
+                             upscale_below: int = 160, max_upscale: float = 4.0,
+                             max_candidates: int = 4) -> List[Detection]:
+        """
+        Декодирует вырезки вокруг областей-кандидатов (find_qr_candidates на кадре, уменьшенном
+        до ширины width) через decode_qr_region, то есть с кэшем и лестницей предобработки.
+
+        :param gray: Кадр в оттенках серого.
+        :type gray: np.ndarray
+        :param width: Ширина уменьшенного кадра для поиска кандидатов.
+        :type width: int
+        :param padding: Запас вокруг кандидата в долях его размера.
+        :type padding: float
+        :param upscale_below: Вырезки с меньшей стороной меньше этого (пикс.) увеличиваются до него.
+        :type upscale_below: int
+        :param max_upscale: Максимальное увеличение вырезки.
+        :type max_upscale: float
+        :param max_candidates: Сколько кандидатов декодировать.
+        :type max_candidates: int
+        :return: Метки в координатах кадра.
+        :rtype: List[Detection]
+        """
+        scale = min(width / gray.shape[1], 1.0)
+        small = gray if scale >= 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        height, frame_width = gray.shape[:2]
+        detections: List[Detection] = []
+        found = set()
+        for x, y, w, h in find_qr_candidates(small, max_candidates=max_candidates):
+            x, y, w, h = int(x / scale), int(y / scale), int(w / scale), int(h / scale)
+            pad_x, pad_y = int(w * padding), int(h * padding)
+            x0, y0 = max(x - pad_x, 0), max(y - pad_y, 0)
+            x1, y1 = min(x + w + pad_x, frame_width), min(y + h + pad_y, height)
+            crop = gray[y0:y1, x0:x1]
+            upscale = min(max(upscale_below / max(min(crop.shape[:2]), 1), 1.0), max_upscale)
+            for detection in self.decode_qr_region(crop, upscale):
+                if detection.key not in found:
+                    found.add(detection.key)
+                    detections.append(translate_detection(detection, (x0, y0)))
+        return detections
+
+    def decode_qr(self, gray: np.ndarray) -> List[Detection]:
+        """
+        Один проход декодера QR-кодов по изображению.
+        """
+        decoder = self.decoder if self.decoder is not None else get_default_qr_decoder()
+        started = time.perf_counter()
+        qr_codes = decoder.decode(gray)
+        elapsed = time.perf_counter() - started
+        return [_make_detection(KIND_QR, data, data, corners, elapsed) for data, corners in qr_codes]
+
+    def detect_aruco(self, gray: np.ndarray) -> List[Detection]:
+        started = time.perf_counter()
+        corners, ids, _ = self.aruco_detector.detectMarkers(gray)
+        elapsed = time.perf_counter() - started
+        detections = []
+        if ids is not None:
+            for marker_corners, marker_id in zip(corners, ids.flatten()):
+                marker_id = int(marker_id)
+                detections.append(_make_detection(KIND_ARUCO, f"ArUco_{marker_id}", marker_id,
+                                                  marker_corners, elapsed))
+        return detections
+
+    def decode_qr_region(self, crop: np.ndarray, upscale: float = 1.0) -> List[Detection]:
+        """
+        Декодирует QR-коды в вырезке-кандидате, используя кэш по содержимому, если он задан.
+
+        :param crop: Вырезка в оттенках серого.
+        :type crop: np.ndarray
+        :param upscale: Во сколько раз увеличить вырезку перед декодированием.
+        :type upscale: float
+        :return: Метки в координатах вырезки (без увеличения).
+        :rtype: List[Detection]
+        """
+        started = time.perf_counter()
+        if self.cache is not None:
+            bits, codes = self.cache.lookup(crop)
+            if codes is not None:
+                elapsed = time.perf_counter() - started
+                return [_make_detection(kind, key, data, corners, elapsed) for kind, key, data, corners in codes]
+        image = crop
+        if upscale > 1.0:
+            image = cv2.resize(crop, None, fx=upscale, fy=upscale, interpolation=cv2.INTER_CUBIC)
+        detections = self.decode_qr(image)
+        complete = True
+        if not detections and self.retry is not None:
+            detections, scale, complete = self.retry.decode(image, self.decode_qr)
+            upscale *= scale
+        detections = [translate_detection(d, (0, 0), upscale) for d in detections]
+        # Неудачу, не проверенную всеми шагами лестницы (кончился бюджет), не запоминаем
+        if self.cache is not None and complete:
+            self.cache.store(bits, crop, [(d.kind, d.key, d.data, d.corners) for d in detections])
+        return detections
+
+    def begin_frame(self) -> None:
+        """
+        Начало нового кадра: обновляет бюджет повторного декодирования.
+        """
+        if self.retry is not None:
+            self.retry.begin_frame()
+
+    def detect_region(self, crop: np.ndarray) -> List[Detection]:
+        """
+        Ищет метки в вырезке в оттенках серого (например, вокруг прогноза положения цели).
+        """
+        detections = self.decode_qr_region(crop) if self.qr else []
+        if self.aruco_markers:
+            detections += self.detect_aruco(crop)
+        return detections
+
+    def detect(self, frame: np.ndarray, frame_id: Optional[Hashable] = None, force: bool = False) -> List[Detection]:
+        """
+        Ищет QR-коды и ArUco-метки в кадре.
+
+        :param frame: Кадр BGR или в оттенках серого.
+        :type frame: np.ndarray
+        :param frame_id: Идентификатор кадра для кэширования результата.
+        :type frame_id: Optional[Hashable]
+        :param force: Декодировать кадр в любом случае, без blur_gate, prefilter и gate
+            (единственная попытка, например в точке облёта).
+        :type force: bool
+        :return: Сначала QR-коды, затем ArUco-метки.
+        :rtype: List[Detection]
+        """
+        if frame_id is not None and not force:
+            with self._cache_lock:
+                if frame_id == self._cache_id:
+                    return list(self._cache)
+        gray = to_gray(frame)
+        audit = False
+        if not force:
+            if self.blur_gate is not None and not self.blur_gate.should_process(gray):
+                with self._cache_lock:
+                    self._cache_id = frame_id
+                    self._cache = []
+                return []
+            if self.prefilter is not None and not self.prefilter.check(gray):
+                audit = self.prefilter.audit_due()
+                if not audit:
+                    with self._cache_lock:
+                        self._cache_id = frame_id
+                        self._cache = []
+                    return []
+            # Проверочный кадр фильтра декодируется в любом случае
+            if not audit and self.gate is not None and not self.gate.should_process(gray):
+                with self._cache_lock:
+                    self._cache_id = frame_id
+                    self._cache = []
+                return []
+        self.begin_frame()
+        if self.parallel:
+            aruco_future = self._executor.submit(self.detect_aruco, gray)
+            detections = self.detect_qr(gray) + aruco_future.result()
+        else:
+            detections = self.detect_qr(gray) if self.qr else []
+            if self.aruco_markers:
+                detections += self.detect_aruco(gray)
+        if audit:
+            # Кадр отклонён фильтром и декодирован только для оценки пропусков
+            self.prefilter.record_audit(bool(detections))
+        with self._cache_lock:
+            self._cache_id = frame_id
+            self._cache = list(detections)
+        return detections
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def draw_detections(frame: np.ndarray, detections: List[Detection]) -> np.ndarray:
+    """
+    Рисует найденные метки на кадре (на месте) и возвращает его.
+    """
+    for detection in detections:
+        if detection.kind == KIND_QR:
+            x, y, w, h = detection.rect
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            cv2.putText(frame, detection.key, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        else:
+            points = detection.corners.astype(np.int32).reshape(-1, 1, 2)
+            cv2.polylines(frame, [points], True, (0, 255, 0), 2)
+            cv2.putText(frame, str(detection.data), tuple(map(int, detection.corners[0])),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+    return frame
@@ -0,0 +1,212 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .marker_detector import KIND_ARUCO, KIND_QR, Detection
+
+
+class CameraIntrinsics(NamedTuple):
+    camera_matrix: np.ndarray  # Матрица камеры 3x3
+    dist_coeffs: np.ndarray  # Коэффициенты дисторсии
+
+
+class MarkerPose(NamedTuple):
+    key: str  # Ключ метки
+    rvec: np.ndarray  # Поворот метки относительно камеры (вектор Родрига, 3,)
+    tvec: np.ndarray  # Центр метки в системе камеры (x вправо, y вниз, z вдоль оси), м
+    size_px: float = 0.0  # Средняя длина стороны метки в кадре, пикс
+
+
+def camera_intrinsics(frame_center: Tuple[int, int], focal: float = 700.0,
+                      dist_coeffs: Optional[np.ndarray] = None) -> CameraIntrinsics:
+    """
+    Параметры камеры без калибровки: фокусное расстояние в пикселях и главная точка в центре кадра.
+
+    :param frame_center: Центр кадра (ширина, высота).
+    :type frame_center: Tuple[int, int]
+    :param focal: Фокусное расстояние в пикселях.
+    :type focal: float
+    :param dist_coeffs: Коэффициенты дисторсии (по умолчанию нулевые).
+    :type dist_coeffs: Optional[np.ndarray]
+    :return: Параметры камеры.
+    :rtype: CameraIntrinsics
+    """
+    camera_matrix = np.array([[focal, 0, frame_center[0]],
+                              [0, focal, frame_center[1]],
+                              [0, 0, 1]], dtype=np.float64)
+    if dist_coeffs is None:
+        dist_coeffs = np.zeros(5)
+    return CameraIntrinsics(camera_matrix, np.asarray(dist_coeffs, dtype=np.float64))
+
+
+def load_camera_intrinsics(path: str) -> CameraIntrinsics:
+    """
+    Загружает результат калибровки камеры (cv2.FileStorage: camera_matrix и dist_coeffs).
+    """
+    storage = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    try:
+        camera_matrix = storage.getNode("camera_matrix").mat()
+        dist_coeffs = storage.getNode("dist_coeffs").mat()
+    finally:
+        storage.release()
+    if camera_matrix is None:
+        raise ValueError(f"В файле {path} нет camera_matrix")
+    if dist_coeffs is None:
+        dist_coeffs = np.zeros(5)
+    return CameraIntrinsics(camera_matrix.astype(np.float64), dist_coeffs.reshape(-1).astype(np.float64))
+
+
+def _order_square(corners: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Приводит вершины метки к четырём, обходимым по часовой стрелке в кадре, как у ArUco.
+    """
+    corners = np.asarray(corners, dtype=np.float32).reshape(-1, 2)
+    if len(corners) != 4:
+        hull = cv2.convexHull(corners)
+        corners = cv2.approxPolyDP(hull, 0.05 * cv2.arcLength(hull, True), True).reshape(-1, 2)
+        if len(corners) != 4:
+            return None
+    x, y = corners[:, 0], corners[:, 1]
+    if np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)) < 0:
+        corners = corners[::-1]
+    return corners
+
+
+def _solve_square_poses(keys: List[str], corners: np.ndarray, sizes: List[float],
+                        intrinsics: CameraIntrinsics) -> Dict[str, MarkerPose]:
+    # corners: (N, 4, 2) в пикселях исходного кадра, обход по часовой стрелке
+    normalized = cv2.undistortPoints(corners.reshape(-1, 1, 2), intrinsics.camera_matrix,
+                                     intrinsics.dist_coeffs).reshape(len(keys), 4, 2)
+    # Порядок вершин: левая верхняя, правая верхняя, правая нижняя, левая нижняя
+    unit_square = np.array([[-0.5, 0.5, 0], [0.5, 0.5, 0], [0.5, -0.5, 0], [-0.5, -0.5, 0]], dtype=np.float64)
+    identity = np.eye(3)
+    poses = {}
+    for key, points, pixels, size in zip(keys, normalized, corners, sizes):
+        object_points = unit_square * size
+        ok, rvec, tvec = cv2.solvePnP(object_points, points, identity, None, flags=cv2.SOLVEPNP_IPPE_SQUARE)
+        if not ok:
+            continue
+        # IPPE неточен, когда метка почти параллельна плоскости кадра (съёмка сверху) - уточняем LM
+        rvec, tvec = cv2.solvePnPRefineLM(object_points, points, identity, None, rvec, tvec)
+        if tvec[2, 0] > 0:
+            size_px = float(np.linalg.norm(pixels - np.roll(pixels, 1, axis=0), axis=1).mean())
+            poses[key] = MarkerPose(key, rvec.reshape(3), tvec.reshape(3), size_px)
+    return poses
+
+
+def estimate_marker_poses(detections: List[Detection], marker_size: float, intrinsics: CameraIntrinsics,
+                          scale: float = 1.0) -> Dict[str, MarkerPose]:
+    """
+    Оценивает положение всех ArUco-меток кадра по четырём вершинам (solvePnP, SOLVEPNP_IPPE_SQUARE).
+    Вершины всех меток переводятся в нормированные координаты камеры одним вызовом
+    cv2.undistortPoints, после чего для каждой метки решается задача PnP без матрицы камеры
+    и решение уточняется методом Левенберга-Марквардта.
+    Смещение получается в метрах и не зависит от высоты из телеметрии.
+
+    :param detections: Метки кадра; QR-коды и метки с числом вершин, отличным от 4, пропускаются.
+    :type detections: List[Detection]
+    :param marker_size: Длина стороны метки, м.
+    :type marker_size: float
+    :param intrinsics: Параметры камеры для исходного разрешения кадра.
+    :type intrinsics: CameraIntrinsics
+    :param scale: Масштаб кадра, в котором найдены метки, относительно исходного (CameraFrame.scale).
+    :type scale: float
+    :return: Положения меток по ключам.
+    :rtype: Dict[str, MarkerPose]
+    """
+    markers = [d for d in detections if d.kind == KIND_ARUCO and len(d.corners) == 4]
+    if not markers:
+        return {}
+    corners = np.stack([d.corners for d in markers]).astype(np.float64) / scale
+    return _solve_square_poses([d.key for d in markers], corners, [marker_size] * len(markers), intrinsics)
+
+
+def qr_edge_length(key: str, edge_lengths: Dict[str, float]) -> Optional[float]:
+    """
+    Длина стороны QR-кода по префиксу его данных ("Box_1" -> edge_lengths["Box"]).
+    """
+    for prefix, length in edge_lengths.items():
+        if key.startswith(prefix):
+            return length
+    return None
+
+
+def refine_corners(gray: np.ndarray, corners: np.ndarray, window: Optional[int] = None) -> np.ndarray:
+    """
+    Уточняет вершины метки до долей пикселя (cv2.cornerSubPix). Окно поиска по умолчанию - около
+    модуля QR-кода, чтобы вершина не смещалась к соседним модулям.
+    """
+    points = np.asarray(corners, dtype=np.float32).reshape(-1, 1, 2).copy()
+    height, width = gray.shape[:2]
+    if window is None:
+        side = float(np.linalg.norm(points[:, 0] - np.roll(points[:, 0], 1, axis=0), axis=1).mean())
+        window = int(np.clip(side / 25, 2, 5))
+    inside = ((points[:, 0, 0] >= window) & (points[:, 0, 0] < width - window)
+              & (points[:, 0, 1] >= window) & (points[:, 0, 1] < height - window))
+    if not inside.all():
+        return points.reshape(-1, 2)  # Окно у края кадра выходит за изображение
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.01)
+    cv2.cornerSubPix(gray, points, (window, window), (-1, -1), criteria)
+    return points.reshape(-1, 2)
+
+
+def estimate_qr_poses(gray: np.ndarray, detections: List[Detection], intrinsics: CameraIntrinsics,
+                      edge_lengths: Dict[str, float], scale: float = 1.0) -> Dict[str, MarkerPose]:
+    """
+    Оценивает положение QR-кодов известного размера по их видимому размеру: вершины уточняются
+    cornerSubPix и решается задача PnP, как для ArUco-меток. Дальность и смещение не зависят
+    от высоты из телеметрии.
+
+    :param gray: Кадр в оттенках серого, в котором найдены коды.
+    :type gray: np.ndarray
+    :param detections: Метки кадра; ArUco-метки и коды с неизвестным размером пропускаются.
+    :type detections: List[Detection]
+    :param intrinsics: Параметры камеры для исходного разрешения кадра.
+    :type intrinsics: CameraIntrinsics
+    :param edge_lengths: Измеренная длина стороны кода (м) по префиксу данных, например {"Box": 0.2}.
+    :type edge_lengths: Dict[str, float]
+    :param scale: Масштаб кадра, в котором найдены коды, относительно исходного (CameraFrame.scale).
+    :type scale: float
+    :return: Положения кодов по ключам.
+    :rtype: Dict[str, MarkerPose]
+    """
+    keys, corners, sizes = [], [], []
+    for detection in detections:
+        size = qr_edge_length(detection.key, edge_lengths) if detection.kind == KIND_QR else None
+        square = _order_square(detection.corners) if size is not None else None
+        if square is None:
+            continue
+        keys.append(detection.key)
+        corners.append(refine_corners(gray, square) / scale)
+        sizes.append(size)
+    if not keys:
+        return {}
+    return _solve_square_poses(keys, np.stack(corners).astype(np.float64), sizes, intrinsics)
+
+
+def fuse_pose_with_altitude(pose: MarkerPose, altitude: Optional[float], altitude_sigma: float = 0.15,
+                            pixel_sigma: float = 0.5) -> MarkerPose:
+    """
+    Объединяет дальность до метки по её видимому размеру с высотой из телеметрии. Направление
+    на метку общее, различаются только дальности; они усредняются с весами, обратными
+    дисперсиям: ошибка дальности по размеру растёт как дальность * pixel_sigma / size_px.
+
+    :param pose: Положение метки из solvePnP.
+    :type pose: MarkerPose
+    :param altitude: Высота дрона над меткой из телеметрии (None или <= 0 - нет данных).
+    :type altitude: Optional[float]
+    :param altitude_sigma: Ошибка высоты из телеметрии, м.
+    :type altitude_sigma: float
+    :param pixel_sigma: Ошибка положения вершины в кадре, пикс.
+    :type pixel_sigma: float
+    :return: Положение метки с уточнённой дальностью.
+    :rtype: MarkerPose
+    """
+    distance = float(pose.tvec[2])
+    if altitude is None or altitude <= 0 or pose.size_px <= 0:
+        return pose
+    pose_sigma = distance * pixel_sigma / pose.size_px
+    pose_weight, altitude_weight = 1 / pose_sigma ** 2, 1 / altitude_sigma ** 2
+    fused = (distance * pose_weight + altitude * altitude_weight) / (pose_weight + altitude_weight)
+    return pose._replace(tvec=pose.tvec * (fused / distance))
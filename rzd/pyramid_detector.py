@@ -0,0 +1,95 @@
+from typing import List, Optional
+
+import cv2
+import cv2.aruco as aruco
+import numpy as np
+
+from .candidates import CandidatePrefilter, Rect, find_qr_candidates
+from .decode_cache import DecodeCache
+from .frame_gating import SharpnessGate
+from .marker_detector import Detection, MarkerDetector, translate_detection
+from .qr_backends import QRDecoder
+from .retry_ladder import RetryLadder
+
+
+def _overlaps(rect: Rect, detections: List[Detection]) -> bool:
+    x, y, w, h = rect
+    for detection in detections:
+        dx, dy, dw, dh = detection.rect
+        if x < dx + dw and dx < x + w and y < dy + dh and dy < y + h:
+            return True
+    return False
+
+
+class PyramidDetector(MarkerDetector):
+    """
+    Поиск QR-кодов от грубого к точному. Сначала декодер QR запускается на кадре, уменьшенном
+    в downscale раз: так дёшево находятся крупные коды. Затем на том же уменьшенном кадре
+    ищутся области-кандидаты (find_qr_candidates), и каждая из них, не покрытая уже найденными
+    кодами, декодируется в исходном разрешении, а мелкая - с увеличением. Вершины всех
+    меток возвращаются в координатах исходного кадра, поэтому детектор можно передавать
+    в detect_qr_global вместо MarkerDetector.
+    """
+
+    def __init__(self, qr: bool = True, aruco_markers: bool = True,
+                 aruco_dictionary: int = aruco.DICT_4X4_50, parallel: bool = False,
+                 downscale: float = 2.0, padding: float = 0.25, upscale_below: int = 160,
+                 max_upscale: float = 4.0, max_candidates: int = 8, cache: Optional[DecodeCache] = None,
+                 decoder: Optional[QRDecoder] = None, prefilter: Optional[CandidatePrefilter] = None,
+                 blur_gate: Optional[SharpnessGate] = None, retry: Optional[RetryLadder] = None):
+        """
+        :param downscale: Во сколько раз уменьшать кадр для грубого прохода.
+        :type downscale: float
+        :param padding: Запас вокруг кандидата в долях его размера.
+        :type padding: float
+        :param upscale_below: Вырезки с меньшей стороной меньше этого (пикс.) увеличиваются до него.
+        :type upscale_below: int
+        :param max_upscale: Максимальное увеличение вырезки.
+        :type max_upscale: float
+        :param max_candidates: Сколько кандидатов декодировать за кадр.
+        :type max_candidates: int
+        :param cache: Кэш результатов декодирования кандидатов.
+        :type cache: Optional[DecodeCache]
+        :param decoder: Декодер QR-кодов (по умолчанию - выбранный калибровкой).
+        :type decoder: Optional[QRDecoder]
+        :param prefilter: Фильтр кадров без кандидатов.
+        :type prefilter: Optional[CandidatePrefilter]
+        :param blur_gate: Пропуск смазанных кадров.
+        :type blur_gate: Optional[SharpnessGate]
+        :param retry: Повторное декодирование нечитаемых кандидатов с предобработкой.
+        :type retry: Optional[RetryLadder]
+        """
+        super().__init__(qr, aruco_markers, aruco_dictionary, parallel, cache=cache, decoder=decoder,
+                         prefilter=prefilter, blur_gate=blur_gate, retry=retry)
+        self.downscale = downscale
+        self.padding = padding
+        self.upscale_below = upscale_below
+        self.max_upscale = max_upscale
+        self.max_candidates = max_candidates
+
+    def detect_qr(self, gray: np.ndarray) -> List[Detection]:
+        if self.downscale <= 1:
+            small = gray
+        else:
+            small = cv2.resize(gray, None, fx=1 / self.downscale, fy=1 / self.downscale,
+                               interpolation=cv2.INTER_AREA)
+        scale = small.shape[1] / gray.shape[1]
+        detections = [translate_detection(d, (0, 0), scale) for d in self.decode_qr(small)]
+        found = {detection.key for detection in detections}
+
+        height, width = gray.shape[:2]
+        for x, y, w, h in find_qr_candidates(small, max_candidates=self.max_candidates):
+            rect = (int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+            if _overlaps(rect, detections):
+                continue
+            x, y, w, h = rect
+            pad_x, pad_y = int(w * self.padding), int(h * self.padding)
+            x0, y0 = max(x - pad_x, 0), max(y - pad_y, 0)
+            x1, y1 = min(x + w + pad_x, width), min(y + h + pad_y, height)
+            crop = gray[y0:y1, x0:x1]
+            upscale = min(max(self.upscale_below / max(min(crop.shape[:2]), 1), 1.0), self.max_upscale)
+            for detection in self.decode_qr_region(crop, upscale):
+                if detection.key not in found:
+                    found.add(detection.key)
+                    detections.append(translate_detection(detection, (x0, y0)))
+        return detections
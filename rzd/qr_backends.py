@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import cv2
+import numpy as np
+from pyzbar import pyzbar
+
+# Результат декодера: данные кода и его вершины (N, 2) в пикселях изображения
+DecodedQR = Tuple[str, np.ndarray]
+
+
+class QRDecoder(ABC):
+    """
+    Декодер QR-кодов для MarkerDetector. Принимает изображение в оттенках серого и возвращает
+    данные и вершины всех найденных кодов. Реализации должны допускать вызов из нескольких потоков.
+    """
+    name = "base"
+
+    @abstractmethod
+    def decode(self, gray: np.ndarray) -> List[DecodedQR]:
+        pass
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+
+class PyzbarDecoder(QRDecoder):
+    """
+    pyzbar (ZBar), ограниченный символикой QR: остальные декодеры ZBar не запускаются.
+    """
+    name = "pyzbar"
+
+    def decode(self, gray: np.ndarray) -> List[DecodedQR]:
+        return [(code.data.decode("utf-8"), np.array(code.polygon, dtype=np.float32))
+                for code in pyzbar.decode(gray, symbols=[pyzbar.ZBarSymbol.QRCODE])]
+
+
+class _OpenCVDecoder(QRDecoder):
+    # Объекты детекторов OpenCV хранят состояние, поэтому у каждого потока свой
+    def __init__(self):
+        self._local = threading.local()
+
+    def _create(self):
+        return cv2.QRCodeDetector()
+
+    @property
+    def detector(self):
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self._local.detector = self._create()
+        return detector
+
+
+class OpenCVDecoder(_OpenCVDecoder):
+    """
+    cv2.QRCodeDetector.detectAndDecode: один код на кадр, самый быстрый из декодеров OpenCV.
+    """
+    name = "opencv"
+
+    def decode(self, gray: np.ndarray) -> List[DecodedQR]:
+        data, points, _ = self.detector.detectAndDecode(gray)
+        if not data or points is None:
+            return []
+        return [(data, points.reshape(-1, 2).astype(np.float32))]
+
+
+class OpenCVMultiDecoder(_OpenCVDecoder):
+    """
+    cv2.QRCodeDetector.detectAndDecodeMulti: все коды в кадре.
+    """
+    name = "opencv_multi"
+
+    def decode(self, gray: np.ndarray) -> List[DecodedQR]:
+        ok, texts, points, _ = self.detector.detectAndDecodeMulti(gray)
+        if not ok or points is None:
+            return []
+        return [(text, corners.reshape(-1, 2).astype(np.float32)) for text, corners in zip(texts, points) if text]
+
+
+class OpenCVArucoDecoder(OpenCVMultiDecoder):
+    """
+    cv2.QRCodeDetectorAruco: поиск шаблонов через детектор ArUco, устойчивее к размытию и перспективе.
+    """
+    name = "opencv_aruco"
+
+    def _create(self):
+        return cv2.QRCodeDetectorAruco()
+
+
+def available_decoders() -> List[QRDecoder]:
+    """
+    Все декодеры, доступные в текущей сборке OpenCV.
+    """
+    decoders: List[QRDecoder] = [PyzbarDecoder(), OpenCVDecoder(), OpenCVMultiDecoder()]
+    if hasattr(cv2, "QRCodeDetectorAruco"):
+        decoders.append(OpenCVArucoDecoder())
+    return decoders
+
+
+_default_decoder: QRDecoder = PyzbarDecoder()
+
+
+def get_default_qr_decoder() -> QRDecoder:
+    return _default_decoder
+
+
+def set_default_qr_decoder(decoder: QRDecoder) -> None:
+    """
+    Задаёт декодер для всех MarkerDetector, у которых декодер не указан явно.
+    """
+    global _default_decoder
+    _default_decoder = decoder
+
+
+def load_sample_frames(path: str, limit: int = 50) -> List[np.ndarray]:
+    """
+    Загружает образцы кадров в оттенках серого из папки с изображениями.
+    """
+    if not os.path.isdir(path):
+        return []
+    names = sorted(n for n in os.listdir(path) if n.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+    frames = []
+    for name in names[:limit]:
+        image = cv2.imread(os.path.join(path, name), cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            frames.append(image)
+    return frames
+
+
+def calibrate_qr_decoder(frames: Sequence[np.ndarray], decoders: Optional[Iterable[QRDecoder]] = None,
+                         min_success: float = 0.9, expected: Optional[Sequence[Set[str]]] = None,
+                         repeats: int = 1) -> Tuple[QRDecoder, Dict[str, Dict[str, float]]]:
+    """
+    Замеряет декодеры на образцах кадров и выбирает самый быстрый из тех, что находят
+    не меньше min_success кодов. Если expected не задан, эталоном для кадра считается
+    объединение кодов, найденных всеми декодерами.
+
+    :param frames: Образцы кадров (BGR или в оттенках серого), желательно с кодами.
+    :type frames: Sequence[np.ndarray]
+    :param decoders: Декодеры-кандидаты (по умолчанию available_decoders()).
+    :type decoders: Optional[Iterable[QRDecoder]]
+    :param min_success: Минимальная доля найденных кодов.
+    :type min_success: float
+    :param expected: Ожидаемые данные кодов для каждого кадра.
+    :type expected: Optional[Sequence[Set[str]]]
+    :param repeats: Сколько раз прогонять каждый кадр для замера времени.
+    :type repeats: int
+    :return: Выбранный декодер и отчёт {имя: {"success": доля, "mean_ms": среднее время}}.
+    :rtype: Tuple[QRDecoder, Dict[str, Dict[str, float]]]
+    """
+    decoders = list(decoders) if decoders is not None else available_decoders()
+    frames = [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) if f.ndim == 3 else f for f in frames]
+    found: Dict[str, List[Set[str]]] = {}
+    times: Dict[str, float] = {}
+    for decoder in decoders:
+        if frames:
+            decoder.decode(frames[0])  # Прогрев
+        results = []
+        started = time.perf_counter()
+        for frame in frames:
+            for _ in range(repeats):
+                codes = decoder.decode(frame)
+            results.append({data for data, _ in codes})
+        times[decoder.name] = (time.perf_counter() - started) / max(len(frames) * repeats, 1) * 1000.0
+        found[decoder.name] = results
+
+    if expected is None:
+        expected = [set().union(*(found[d.name][i] for d in decoders)) for i in range(len(frames))]
+    total = sum(len(codes) for codes in expected)
+    report = {}
+    for decoder in decoders:
+        hits = sum(len(found[decoder.name][i] & expected[i]) for i in range(len(frames)))
+        report[decoder.name] = {"success": hits / total if total else 0.0, "mean_ms": times[decoder.name]}
+    if total == 0:
+        return get_default_qr_decoder(), report  # В образцах нет кодов - сравнивать не по чему
+
+    suitable = [d for d in decoders if report[d.name]["success"] >= min_success]
+    if suitable:
+        best = min(suitable, key=lambda d: report[d.name]["mean_ms"])
+    else:
+        best = max(decoders, key=lambda d: (report[d.name]["success"], -report[d.name]["mean_ms"]))
+    return best, report
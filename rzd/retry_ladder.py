@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Шаг лестницы: изображение -> (обработанное изображение, во сколько раз оно увеличено)
+RetryStep = Tuple[str, Callable[[np.ndarray], Tuple[np.ndarray, float]]]
+
+
+def _clahe(clip_limit: float, tile: int) -> Callable[[np.ndarray], Tuple[np.ndarray, float]]:
+    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile, tile))
+    return lambda image: (clahe.apply(image), 1.0)
+
+
+def _adaptive_threshold(block: int) -> Callable[[np.ndarray], Tuple[np.ndarray, float]]:
+    return lambda image: (cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY,
+                                                block, 5), 1.0)
+
+
+def _sharpen(amount: float) -> Callable[[np.ndarray], Tuple[np.ndarray, float]]:
+    def sharpen(image: np.ndarray) -> Tuple[np.ndarray, float]:
+        blurred = cv2.GaussianBlur(image, (0, 0), 2.0)
+        return cv2.addWeighted(image, 1.0 + amount, blurred, -amount, 0), 1.0
+    return sharpen
+
+
+def _upscale(factor: float) -> Callable[[np.ndarray], Tuple[np.ndarray, float]]:
+    return lambda image: (cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC), factor)
+
+
+def default_retry_steps(clip_limit: float = 2.0, tile: int = 8, block: int = 31, sharpen: float = 1.5,
+                        upscale: float = 2.0) -> List[RetryStep]:
+    """
+    Шаги лестницы по умолчанию, от дешёвых к дорогим: выравнивание контраста (CLAHE),
+    адаптивная бинаризация (неравномерное освещение, блики), повышение резкости, увеличение.
+    """
+    return [("clahe", _clahe(clip_limit, tile)), ("threshold", _adaptive_threshold(block)),
+            ("sharpen", _sharpen(sharpen)), ("upscale", _upscale(upscale))]
+
+
+class RetryLadder:
+    """
+    Повторное декодирование вырезок-кандидатов, на которых декодер ничего не нашёл:
+    вырезка по очереди обрабатывается шагами лестницы, пока код не прочитается.
+    Лестница запускается только после неудачи, поэтому кадры, декодированные с первой
+    попытки, ничего не теряют. На все повторы в кадре отводится budget секунд;
+    begin_frame() вызывается в начале каждого кадра. Время шага оценивается по прошлым
+    запускам (секунды на пиксель), и шаг, который не успеет в остаток бюджета, пропускается.
+    """
+
+    def __init__(self, steps: Optional[Sequence[RetryStep]] = None, budget: float = 0.02):
+        """
+        :param steps: Шаги лестницы (по умолчанию default_retry_steps()).
+        :type steps: Optional[Sequence[RetryStep]]
+        :param budget: Время на повторы за один кадр, с.
+        :type budget: float
+        """
+        self.steps = list(steps) if steps is not None else default_retry_steps()
+        self.budget = budget
+        self.attempts = 0
+        self.rescued = 0
+        self.out_of_budget = 0
+        self.step_hits: Dict[str, int] = {name: 0 for name, _ in self.steps}
+        self._spent = 0.0
+        self._cost: Dict[str, float] = {}  # Среднее время шага (декодирование включено) на пиксель, с
+        self._lock = threading.Lock()
+
+    def begin_frame(self) -> None:
+        with self._lock:
+            self._spent = 0.0
+
+    def remaining(self) -> float:
+        with self._lock:
+            return self.budget - self._spent
+
+    def decode(self, image: np.ndarray, decode: Callable[[np.ndarray], list]) -> Tuple[list, float, bool]:
+        """
+        Проходит по лестнице, пока decode не вернёт непустой результат. Шаги, которые по оценке
+        не укладываются в остаток бюджета кадра, пропускаются.
+
+        :param image: Вырезка в оттенках серого, на которой декодер ничего не нашёл.
+        :type image: np.ndarray
+        :param decode: Функция декодирования изображения.
+        :type decode: Callable[[np.ndarray], list]
+        :return: Результат decode, увеличение изображения, на котором он получен,
+            и True, если пройдены все шаги (отрицательный результат окончательный).
+        :rtype: Tuple[list, float, bool]
+        """
+        with self._lock:
+            self.attempts += 1
+        complete = True
+        for name, step in self.steps:
+            with self._lock:
+                estimate = self._cost.get(name, 0.0) * image.size
+                fits = estimate < self.budget - self._spent
+            if not fits:
+                complete = False
+                continue
+            started = time.perf_counter()
+            processed, scale = step(image)
+            result = decode(processed)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._spent += elapsed
+                cost = elapsed / max(image.size, 1)
+                self._cost[name] = cost if name not in self._cost else 0.8 * self._cost[name] + 0.2 * cost
+                if result:
+                    self.rescued += 1
+                    self.step_hits[name] += 1
+            if result:
+                return result, scale, True
+        if not complete:
+            with self._lock:
+                self.out_of_budget += 1
+        return [], 1.0, complete
+
+    def stats(self) -> Dict[str, float]:
+        return {"attempts": self.attempts, "rescued": self.rescued, "out_of_budget": self.out_of_budget,
+                "step_hits": dict(self.step_hits)}
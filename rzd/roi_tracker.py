@@ -0,0 +1,175 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .drone_cv import to_gray
+from .marker_detector import Detection, MarkerDetector, translate_detection
+
+
+class _Track:
+    def __init__(self, detection: Detection, timestamp: float):
+        self.key = detection.key
+        self.rect = np.array(detection.rect, dtype=np.float64)  # x, y, w, h
+        self.velocity = np.zeros(2)  # Скорость центра метки в кадре, пикс/с
+        self.timestamp = timestamp
+        self.misses = 0
+
+    @property
+    def center(self) -> np.ndarray:
+        return self.rect[:2] + self.rect[2:] / 2
+
+    def update(self, detection: Detection, timestamp: float, smoothing: float) -> None:
+        dt = timestamp - self.timestamp
+        if dt > 0:
+            measured = (np.asarray(detection.center, dtype=np.float64) - self.center) / dt
+            self.velocity = smoothing * measured + (1 - smoothing) * self.velocity
+        self.rect = np.array(detection.rect, dtype=np.float64)
+        self.timestamp = timestamp
+        self.misses = 0
+
+
+class RoiTracker:
+    """
+    Поиск меток с отслеживанием: после обнаружения положение метки в следующем кадре
+    предсказывается по её последней рамке и скорости (собственной скорости метки в кадре
+    или пересчитанной скорости дрона), и декодируется только вырезка вокруг прогноза.
+    Полный кадр сканируется раз в full_scan_interval кадров и когда все метки потеряны.
+    """
+
+    def __init__(self, detector: Optional[MarkerDetector] = None, full_scan_interval: int = 15,
+                 margin: float = 0.5, min_padding: int = 24, max_misses: int = 2, smoothing: float = 0.5):
+        """
+        :param detector: Детектор меток (по умолчанию только QR-коды).
+        :type detector: Optional[MarkerDetector]
+        :param full_scan_interval: Через сколько кадров повторять поиск по всему кадру.
+        :type full_scan_interval: int
+        :param margin: Запас вокруг предсказанной рамки в долях её размера.
+        :type margin: float
+        :param min_padding: Минимальный запас вокруг рамки в пикселях.
+        :type min_padding: int
+        :param max_misses: Сколько кадров подряд метку можно не найти, прежде чем трек сбрасывается.
+        :type max_misses: int
+        :param smoothing: Вес нового измерения скорости метки (0..1).
+        :type smoothing: float
+        """
+        self.detector = detector if detector is not None else MarkerDetector(aruco_markers=False)
+        self.full_scan_interval = full_scan_interval
+        self.margin = margin
+        self.min_padding = min_padding
+        self.max_misses = max_misses
+        self.smoothing = smoothing
+        self.tracks: Dict[str, _Track] = {}
+        self.full_scans = 0
+        self.roi_scans = 0
+        self.roi_pixels = 0  # Суммарная площадь декодированных вырезок
+        self.frame_pixels = 0  # Суммарная площадь кадров, для оценки выигрыша
+        self._frames_since_full = 0
+
+    def reset(self) -> None:
+        self.tracks.clear()
+        self._frames_since_full = 0
+
+    def predict(self, key: str, timestamp: float,
+                image_velocity: Optional[np.ndarray] = None) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Предсказывает рамку метки на момент timestamp.
+
+        :param key: Ключ метки.
+        :type key: str
+        :param timestamp: Время кадра.
+        :type timestamp: float
+        :param image_velocity: Скорость сдвига сцены в кадре из-за движения дрона, пикс/с.
+            Если не задана, используется скорость, измеренная по прошлым кадрам.
+        :type image_velocity: Optional[np.ndarray]
+        :return: Рамка (x, y, w, h) или None, если метка не отслеживается.
+        :rtype: Optional[Tuple[int, int, int, int]]
+        """
+        track = self.tracks.get(key)
+        if track is None:
+            return None
+        velocity = track.velocity if image_velocity is None else np.asarray(image_velocity, dtype=np.float64)
+        x, y = track.rect[:2] + velocity * max(timestamp - track.timestamp, 0.0)
+        w, h = track.rect[2:]
+        return int(x), int(y), int(w), int(h)
+
+    def _roi(self, rect: Tuple[int, int, int, int], shape) -> Tuple[int, int, int, int]:
+        x, y, w, h = rect
+        pad_x = max(int(w * self.margin), self.min_padding)
+        pad_y = max(int(h * self.margin), self.min_padding)
+        height, width = shape[:2]
+        return max(x - pad_x, 0), max(y - pad_y, 0), min(x + w + pad_x, width), min(y + h + pad_y, height)
+
+    def _full_scan(self, frame: np.ndarray, timestamp: float) -> List[Detection]:
+        detections = self.detector.detect(frame)
+        self.full_scans += 1
+        self._frames_since_full = 0
+        for detection in detections:
+            track = self.tracks.get(detection.key)
+            if track is None:
+                self.tracks[detection.key] = _Track(detection, timestamp)
+            else:
+                track.update(detection, timestamp, self.smoothing)
+        found = {detection.key for detection in detections}
+        for key in [key for key in self.tracks if key not in found]:
+            del self.tracks[key]
+        return detections
+
+    def detect(self, frame: np.ndarray, timestamp: Optional[float] = None,
+               image_velocity: Optional[np.ndarray] = None) -> List[Detection]:
+        """
+        Ищет метки в кадре: в вырезках вокруг отслеживаемых меток или во всём кадре.
+
+        :param frame: Кадр.
+        :type frame: np.ndarray
+        :param timestamp: Время захвата кадра (по умолчанию текущее).
+        :type timestamp: Optional[float]
+        :param image_velocity: Скорость сдвига сцены в кадре из-за движения дрона, пикс/с.
+        :type image_velocity: Optional[np.ndarray]
+        :return: Найденные метки в координатах кадра.
+        :rtype: List[Detection]
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        self.frame_pixels += frame.shape[0] * frame.shape[1]
+        self._frames_since_full += 1
+        if not self.tracks or self._frames_since_full >= self.full_scan_interval:
+            self.roi_pixels += frame.shape[0] * frame.shape[1]
+            return self._full_scan(frame, timestamp)
+
+        gray = to_gray(frame)
+        self.detector.begin_frame()
+        detections: Dict[str, Detection] = {}
+        for key in list(self.tracks):
+            if key in detections:
+                continue  # Уже найдена в вырезке соседнего трека
+            x0, y0, x1, y1 = self._roi(self.predict(key, timestamp, image_velocity), frame.shape)
+            if x1 <= x0 or y1 <= y0:
+                continue  # Прогноз ушёл за край кадра
+            self.roi_scans += 1
+            self.roi_pixels += (x1 - x0) * (y1 - y0)
+            for detection in self.detector.detect_region(gray[y0:y1, x0:x1]):
+                detections.setdefault(detection.key, translate_detection(detection, (x0, y0)))
+
+        for key, track in list(self.tracks.items()):
+            if key in detections:
+                track.update(detections[key], timestamp, self.smoothing)
+            else:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    del self.tracks[key]
+        for key, detection in detections.items():
+            if key not in self.tracks:
+                self.tracks[key] = _Track(detection, timestamp)
+        if not self.tracks:
+            # Все метки потеряны - сразу ищем по всему кадру
+            self.roi_pixels += frame.shape[0] * frame.shape[1]
+            return self._full_scan(frame, timestamp)
+        return list(detections.values())
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "full_scans": self.full_scans,
+            "roi_scans": self.roi_scans,
+            "tracks": len(self.tracks),
+            "decoded_area_ratio": self.roi_pixels / self.frame_pixels if self.frame_pixels else 0.0,
+        }
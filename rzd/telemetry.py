@@ -0,0 +1,143 @@
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+
+class TelemetryRecorder:
+    """
+    Высокочастотная запись телеметрии дрона в кольцевой буфер NumPy фиксированного размера.
+    Каждая строка буфера: [время, x, y, z, yaw]. Позволяет получить позу дрона на момент
+    захвата кадра интерполяцией, а не брать текущую позу на момент обработки кадра.
+    """
+
+    def __init__(self, drone=None, capacity: int = 1024, rate: float = 50.0, log_interval: float = 5.0):
+        self.drone = drone
+        self.capacity = capacity
+        self.rate = rate
+        self.log_interval = log_interval
+        self.errors = 0
+        self._last_log = 0.0  # Время последнего вывода ошибки
+        self._suppressed = 0  # Ошибок, не выведенных с тех пор
+        self._buffer = np.zeros((capacity, 5), dtype=np.float64)
+        self._index = 0  # Куда будет записан следующий отсчёт
+        self._count = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, position=None, yaw: Optional[float] = None, timestamp: Optional[float] = None) -> None:
+        """
+        Записывает отсчёт телеметрии. Без аргументов берёт position и yaw у дрона.
+
+        :param position: Координаты [x, y, z].
+        :param yaw: Угол рыскания в радианах.
+        :type yaw: Optional[float]
+        :param timestamp: Время отсчёта (time.time()).
+        :type timestamp: Optional[float]
+        """
+        if position is None:
+            position = self.drone.position
+            if position is None:
+                return
+        if yaw is None:
+            yaw = getattr(self.drone, "yaw", 0.0)
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            row = self._buffer[self._index]
+            row[0] = timestamp
+            row[1:4] = position[:3]
+            row[4] = yaw
+            self._index = (self._index + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def _ordered(self) -> np.ndarray:
+        # Отсчёты в хронологическом порядке
+        if self._count < self.capacity:
+            return self._buffer[:self._count].copy()
+        return np.concatenate((self._buffer[self._index:], self._buffer[:self._index]))
+
+    def latest(self) -> Optional[np.ndarray]:
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._buffer[(self._index - 1) % self.capacity].copy()
+
+    def pose_at(self, timestamp: float) -> Optional[np.ndarray]:
+        """
+        Интерполирует позу дрона на заданный момент времени.
+
+        :param timestamp: Момент времени (например, время захвата кадра).
+        :type timestamp: float
+        :return: Массив [x, y, z, yaw] или None, если момент старше самого старого отсчёта.
+        :rtype: Optional[np.ndarray]
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            samples = self._ordered()
+        times = samples[:, 0]
+        if timestamp < times[0]:
+            return None
+        pose = np.empty(4)
+        for i in range(3):
+            pose[i] = np.interp(timestamp, times, samples[:, i + 1])
+        # Угол интерполируется без скачка на границе -pi/pi
+        pose[3] = np.interp(timestamp, times, np.unwrap(samples[:, 4]))
+        pose[3] = (pose[3] + np.pi) % (2 * np.pi) - np.pi
+        return pose
+
+    def velocity_at(self, timestamp: float, window: float = 0.2) -> Optional[np.ndarray]:
+        """
+        Оценивает скорость дрона на заданный момент по разности поз за окно window.
+
+        :param timestamp: Момент времени.
+        :type timestamp: float
+        :param window: Длина окна в секундах.
+        :type window: float
+        :return: Массив [vx, vy, vz, vyaw] или None, если в буфере нет отсчётов за окно.
+        :rtype: Optional[np.ndarray]
+        """
+        end = self.pose_at(timestamp)
+        start = self.pose_at(timestamp - window)
+        if end is None or start is None:
+            return None
+        delta = end - start
+        delta[3] = (delta[3] + np.pi) % (2 * np.pi) - np.pi
+        return delta / window
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._record_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _record_loop(self) -> None:
+        period = 1.0 / self.rate
+        while self._running:
+            try:
+                self.record()
+            except Exception as e:
+                self.errors += 1
+                self.log_limited(f"ошибка чтения телеметрии: {e}")
+            time.sleep(period)
+
+    def log_limited(self, message: str) -> None:
+        # Ошибка печатается не чаще раза в log_interval секунд, а не на каждом отсчёте
+        now = time.time()
+        if now - self._last_log < self.log_interval:
+            self._suppressed += 1
+            return
+        if self._suppressed:
+            message = f"{message} (ещё {self._suppressed} таких сообщений подавлено)"
+        print(f"TelemetryRecorder: {message}")
+        self._last_log = now
+        self._suppressed = 0
@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import cv2.aruco as aruco
+import numpy as np
+
+from .candidates import CandidatePrefilter
+from .decode_cache import DecodeCache
+from .frame_gating import SharpnessGate
+from .marker_detector import Detection, MarkerDetector, translate_detection
+from .qr_backends import QRDecoder
+from .retry_ladder import RetryLadder
+
+Tile = Tuple[int, int, int, int]  # x0, y0, x1, y1
+
+
+def make_tiles(width: int, height: int, cols: int, rows: int, overlap: int) -> List[Tile]:
+    """
+    Делит кадр на cols x rows плиток, соседние плитки перекрываются на overlap пикселей.
+    """
+    tiles = []
+    tile_w, tile_h = width / cols, height / rows
+    for row in range(rows):
+        for col in range(cols):
+            x0 = max(int(col * tile_w) - overlap // 2, 0)
+            y0 = max(int(row * tile_h) - overlap // 2, 0)
+            x1 = min(int((col + 1) * tile_w) + overlap // 2, width)
+            y1 = min(int((row + 1) * tile_h) + overlap // 2, height)
+            tiles.append((x0, y0, x1, y1))
+    return tiles
+
+
+def merge_detections(detections: List[Detection], tolerance: float = 0.5) -> List[Detection]:
+    """
+    Объединяет повторы одной метки (например, найденной в двух перекрывающихся плитках):
+    метки с одинаковыми данными считаются одной, если их центры ближе tolerance размера метки.
+    Из повторов остаётся метка с наибольшей рамкой (наименее обрезанная).
+
+    :param detections: Метки в координатах кадра.
+    :type detections: List[Detection]
+    :param tolerance: Допустимое расстояние между центрами в долях стороны рамки.
+    :type tolerance: float
+    :return: Метки без повторов.
+    :rtype: List[Detection]
+    """
+    merged: List[Detection] = []
+    for detection in sorted(detections, key=lambda d: d.rect[2] * d.rect[3], reverse=True):
+        size = max(detection.rect[2], detection.rect[3], 1)
+        duplicate = any(other.key == detection.key
+                        and np.linalg.norm(other.center - detection.center) <= tolerance * size
+                        for other in merged)
+        if not duplicate:
+            merged.append(detection)
+    return merged
+
+
+class TiledDetector(MarkerDetector):
+    """
+    Параллельное декодирование QR-кодов в кадрах высокого разрешения. Кадр в оттенках серого
+    делится на перекрывающиеся плитки, которые декодируются одновременно в пуле потоков
+    (pyzbar и OpenCV отпускают GIL). Плитки декодируются одним проходом декодера; кэш (cache)
+    и лестница предобработки (retry) применяются, как и в MarkerDetector, только к вырезкам
+    вокруг кандидатов, если в кадре ничего не найдено. Коды крупнее перекрытия могут
+    не поместиться ни в одну плитку, поэтому параллельно с плитками декодируется и весь кадр,
+    уменьшенный в coarse_downscale раз. Повторы на границах плиток объединяются по данным
+    и близости вершин.
+    """
+
+    def __init__(self, qr: bool = True, aruco_markers: bool = True,
+                 aruco_dictionary: int = aruco.DICT_4X4_50, parallel: bool = False,
+                 cols: int = 2, rows: int = 2, overlap: int = 160, workers: Optional[int] = None,
+                 coarse_downscale: float = 2.0, cache: Optional[DecodeCache] = None,
+                 decoder: Optional[QRDecoder] = None, prefilter: Optional[CandidatePrefilter] = None,
+                 blur_gate: Optional[SharpnessGate] = None, retry: Optional[RetryLadder] = None):
+        """
+        :param cols: Число плиток по горизонтали.
+        :type cols: int
+        :param rows: Число плиток по вертикали.
+        :type rows: int
+        :param overlap: Перекрытие соседних плиток в пикселях (не меньше размера кода).
+        :type overlap: int
+        :param workers: Число потоков пула (по умолчанию - плитки и уменьшенный кадр).
+        :type workers: Optional[int]
+        :param coarse_downscale: Уменьшение кадра для прохода по всему кадру (0 - не выполнять).
+        :type coarse_downscale: float
+        """
+        super().__init__(qr, aruco_markers, aruco_dictionary, parallel, cache=cache, decoder=decoder,
+                         prefilter=prefilter, blur_gate=blur_gate, retry=retry)
+        self.cols = cols
+        self.rows = rows
+        self.overlap = overlap
+        self.coarse_downscale = coarse_downscale
+        self._pool = ThreadPoolExecutor(max_workers=workers or cols * rows + 1, thread_name_prefix="qr_tile")
+
+    def _decode_tile(self, gray: np.ndarray, tile: Tile) -> List[Detection]:
+        x0, y0, x1, y1 = tile
+        return [translate_detection(d, (x0, y0)) for d in self.decode_qr(gray[y0:y1, x0:x1])]
+
+    def _decode_coarse(self, gray: np.ndarray) -> List[Detection]:
+        small = cv2.resize(gray, None, fx=1 / self.coarse_downscale, fy=1 / self.coarse_downscale,
+                           interpolation=cv2.INTER_AREA)
+        scale = small.shape[1] / gray.shape[1]
+        return [translate_detection(d, (0, 0), scale) for d in self.decode_qr(small)]
+
+    def detect_qr(self, gray: np.ndarray) -> List[Detection]:
+        height, width = gray.shape[:2]
+        futures = [self._pool.submit(self._decode_tile, gray, tile)
+                   for tile in make_tiles(width, height, self.cols, self.rows, self.overlap)]
+        if self.coarse_downscale > 1:
+            futures.append(self._pool.submit(self._decode_coarse, gray))
+        detections = []
+        for future in futures:
+            detections += future.result()
+        if not detections and self.retry is not None:
+            return self.decode_qr_candidates(gray)
+        return merge_detections(detections)
+
+    def close(self) -> None:
+        super().close()
+        self._pool.shutdown(wait=False)
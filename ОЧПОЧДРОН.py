@@ -5,7 +5,6 @@ import numpy as np
 import csv
 import cv2
 from datetime import datetime
-from pyzbar import pyzbar
 from pion.pion import Pion  # Для БВС (Scout и Transport)
 from rzd import *  # Для видеопотока дронов
 from omegabot_poligon77 import Robot  # Для РТС
@@ -29,6 +28,9 @@ WOOD_DEST = (3.5, -0.24, 0)  # Площадка для деревьев
 RAILWAY_START = (-5, 5, 0.03)  # Начало железнодорожного полотна
 RAILWAY_END = (5, -5, 0.03)  # Конец железнодорожного полотна
 WAGON_POS = (0, 0, 0.2)  # Условно центр вагонов
+# Длина стороны QR-кода (м) по префиксу данных груза, например {"Box": 0.2, "Stone": 0.2, "Wood": 0.2}.
+# Если задана, дальность до кода оценивается по его видимому размеру (задать по реальным кодам)
+QR_EDGE_LENGTHS = None
 
 
 # Функция проверки принадлежности точки треугольнику (барицентрические координаты)
@@ -116,14 +118,29 @@ class ScoutDrone:
         self.drone = Pion(ip=drone_info["ip"], mavlink_port=drone_info["mavlink_port"])
         self.start_pos = drone_info["start_pos"]
         self.camera = SocketCamera(ip=drone_info["ip"], port=drone_info["camera_port"])
+        # Единственный читатель камеры: детектор и отображение получают одни и те же кадры
+        self.frame_bus = FrameBus(self.camera, name=f"ScoutDrone {self.id}")
+        self.detector_frames = self.frame_bus.subscribe("detector")
+        self.display_frames = self.frame_bus.subscribe("display")
+        self.frame_bus.start()
+        # Телеметрия пишется с высокой частотой, чтобы брать позу на момент захвата кадра
+        self.telemetry = TelemetryRecorder(self.drone)
+        self.telemetry.start()
+        self.max_frame_age = 0.5  # Кадры старше этого (с) не используются для локализации
         self.frame_center = (320, 240)
+        self.camera_intrinsics = camera_intrinsics(self.frame_center)
         self.qr_found = set()
+        # Как у разведчика в Dronerts.py: смазанные в полёте кадры пропускаются (SharpnessGate).
+        # Коды ищутся только в полёте между точками, поэтому отдельной попытки в точке нет
+        self.marker_detector = MarkerDetector(aruco_markers=False, prefilter=CandidatePrefilter(),
+                                              blur_gate=SharpnessGate())
         self.running = True
         self.height = 1.5 if self.id == 0 else 2.0  # Scout 0: 1.5 м, Scout 1: 2.0 м
         print(f"Scout {self.id}: Инициализация камеры на {drone_info['ip']}:{drone_info['camera_port']}")
         if not self.check_camera_connection():
             print(f"Scout {self.id}: Не удалось подключиться к камере, завершаю инициализацию")
             self.running = False
+            self.frame_bus.stop()
             return
         self.video_thread = threading.Thread(target=self.show_video_stream)
         self.video_thread.start()
@@ -132,7 +149,7 @@ class ScoutDrone:
         max_attempts = 10
         for attempt in range(max_attempts):
             try:
-                frame = self.camera.get_cv_frame()
+                frame = self.detector_frames.get(timeout=2)
                 if frame is not None:
                     print(
                         f"Scout {self.id}: Камера подключена успешно, кадр получен (попытка {attempt + 1}/{max_attempts})")
@@ -178,19 +195,24 @@ class ScoutDrone:
 
     def detect_qr(self):
         try:
-            frame = self.camera.get_cv_frame()
+            packet = self.detector_frames.get(timeout=self.camera.timeout)
+            frame = packet.image if packet is not None else None
             if frame is None:
                 print(f"Scout {self.id}: Не удалось получить кадр")
                 return None
+            if time.time() - packet.timestamp > self.max_frame_age:
+                print(f"Scout {self.id}: Кадр устарел, пропускаю")
+                return None
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            qr_codes = pyzbar.decode(gray)
+            qr_codes = self.marker_detector.detect(frame, packet.seq)
             if qr_codes:
-                qr_code = qr_codes[0]
-                data = qr_code.data.decode("utf-8")
+                data = qr_codes[0].data
                 process_qr_code(self.id, data)
-                points = np.array(qr_code.polygon)
-                coords = self.calculate_coords(points)
+                # Дальность до QR-кода известного размера (QR_EDGE_LENGTHS) по его видимому размеру
+                poses = {}
+                if QR_EDGE_LENGTHS is not None:
+                    poses = estimate_qr_poses(to_gray(frame), qr_codes, self.camera_intrinsics, QR_EDGE_LENGTHS)
+                coords = self.calculate_coords(qr_codes[0].corners, packet.timestamp, poses.get(qr_codes[0].key))
                 if data in ["Box 2 1", "Box 2 2", "Box 1 1", "Box 1 2", "Stone_1", "Wood_1", "Stone_2", "Wood_2"]:
                     detect_object(self.drone, data)
                     print(f"Scout {self.id}: QR-код {data} распознан, координаты: {coords}")
@@ -204,28 +226,34 @@ class ScoutDrone:
             print(f"Scout {self.id}: Ошибка с камерой: {e}")
             return None
 
-    def calculate_coords(self, points):
-        pos = self.drone.position[:3] if self.drone.position is not None else [0, 0, 0]
-        qr_center = np.mean(points, axis=0)
-        shift_x_px = qr_center[0] - self.frame_center[0]
-        shift_y_px = qr_center[1] - self.frame_center[1]
-        shift_x_m = (shift_x_px * self.height) / 700
-        shift_y_m = (shift_y_px * self.height) / 700
+    def calculate_coords(self, points, timestamp=None, pose=None):
+        # Поза дрона на момент захвата кадра, если она есть в записи телеметрии
+        drone_pose = self.telemetry.pose_at(timestamp) if timestamp is not None else None
+        if drone_pose is not None:
+            pos = drone_pose[:3]
+        else:
+            pos = self.drone.position[:3] if self.drone.position is not None else [0, 0, 0]
+        if pose is not None:
+            # Дальность по размеру кода уточняется заданной высотой полёта
+            pose = fuse_pose_with_altitude(pose, self.height)
+            shift_x_m, shift_y_m = pose.tvec[0], pose.tvec[1]
+        else:
+            qr_center = np.mean(points, axis=0)
+            shift_x_px = qr_center[0] - self.frame_center[0]
+            shift_y_px = qr_center[1] - self.frame_center[1]
+            shift_x_m = (shift_x_px * self.height) / 700
+            shift_y_m = (shift_y_px * self.height) / 700
         return [pos[0] + shift_x_m, pos[1] + shift_y_m, self.height]
 
     def show_video_stream(self):
         while self.running:
             try:
-                frame = self.camera.get_cv_frame()
+                packet = self.display_frames.get(timeout=self.camera.timeout)
+                frame = packet.image if packet is not None else None
                 if frame is not None:
-                    display_frame = frame
-                    gray = cv2.cvtColor(display_frame, cv2.COLOR_BGR2GRAY)
-                    qr_codes = pyzbar.decode(gray)
-                    for qr_code in qr_codes:
-                        data = qr_code.data.decode("utf-8")
-                        (x, y, w, h) = qr_code.rect
-                        cv2.rectangle(display_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                        cv2.putText(display_frame, data, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                    # Для кадра, уже обработанного detect_qr, берётся готовый результат
+                    detections = self.marker_detector.detect(frame, packet.seq)
+                    display_frame = draw_detections(frame.copy(), detections)  # Кадр общий с детектором
                     cv2.imshow(f"Scout {self.id} Stream", display_frame)
                     if cv2.waitKey(1) == 27:
                         break
@@ -234,6 +262,9 @@ class ScoutDrone:
             except Exception as e:
                 print(f"Scout {self.id}: Ошибка с видеопотоком: {e}")
             time.sleep(0.1)
+        self.frame_bus.stop()
+        print(f"Scout {self.id}: фильтр кандидатов детектора меток {self.marker_detector.prefilter.stats()}, "
+              f"смазанные кадры {self.marker_detector.blur_gate.stats()}")
 
     def scout_mission(self):
         if not self.running:
@@ -341,7 +372,18 @@ class TransportDrone:
         self.drone = Pion(ip=drone_info["ip"], mavlink_port=drone_info["mavlink_port"])
         self.start_pos = drone_info["start_pos"]
         self.camera = SocketCamera(ip=drone_info["ip"], port=drone_info["camera_port"])
+        # Единственный читатель камеры: детектор и отображение получают одни и те же кадры
+        self.frame_bus = FrameBus(self.camera, name=f"TransportDrone {self.id}")
+        self.detector_frames = self.frame_bus.subscribe("detector")
+        self.display_frames = self.frame_bus.subscribe("display")
+        self.frame_bus.start()
+        # Телеметрия пишется с высокой частотой, чтобы брать позу на момент захвата кадра
+        self.telemetry = TelemetryRecorder(self.drone)
+        self.telemetry.start()
+        self.max_frame_age = 0.5  # Кадры старше этого (с) не используются для локализации
         self.frame_center = (320, 240)
+        self.camera_intrinsics = camera_intrinsics(self.frame_center)
+        self.marker_detector = MarkerDetector(aruco_markers=False, prefilter=CandidatePrefilter())
         self.running = True
         self.group = 1 if self.id == 0 else 2  # Группа 1 для id=0, группа 2 для id=1
         print(
@@ -349,6 +391,7 @@ class TransportDrone:
         if not self.check_camera_connection():
             print(f"Transport {self.id}: Не удалось подключиться к камере, завершаю инициализацию")
             self.running = False
+            self.frame_bus.stop()
             return
         self.video_thread = threading.Thread(target=self.show_video_stream)
         self.video_thread.start()
@@ -357,7 +400,7 @@ class TransportDrone:
         max_attempts = 10
         for attempt in range(max_attempts):
             try:
-                frame = self.camera.get_cv_frame()
+                frame = self.detector_frames.get(timeout=2)
                 if frame is not None:
                     print(
                         f"Transport {self.id}: Камера подключена успешно, кадр получен (попытка {attempt + 1}/{max_attempts})")
@@ -386,19 +429,24 @@ class TransportDrone:
 
     def detect_qr(self):
         try:
-            frame = self.camera.get_cv_frame()
+            packet = self.detector_frames.get(timeout=self.camera.timeout)
+            frame = packet.image if packet is not None else None
             if frame is None:
                 print(f"Transport {self.id}: Не удалось получить кадр")
                 return None
+            if time.time() - packet.timestamp > self.max_frame_age:
+                print(f"Transport {self.id}: Кадр устарел, пропускаю")
+                return None
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            qr_codes = pyzbar.decode(gray)
+            qr_codes = self.marker_detector.detect(frame, packet.seq)
             if qr_codes:
-                qr_code = qr_codes[0]
-                data = qr_code.data.decode("utf-8")
+                data = qr_codes[0].data
                 process_qr_code(self.id, data)
-                points = np.array(qr_code.polygon)
-                coords = self.calculate_coords(points)
+                # Дальность до QR-кода известного размера (QR_EDGE_LENGTHS) по его видимому размеру
+                poses = {}
+                if QR_EDGE_LENGTHS is not None:
+                    poses = estimate_qr_poses(to_gray(frame), qr_codes, self.camera_intrinsics, QR_EDGE_LENGTHS)
+                coords = self.calculate_coords(qr_codes[0].corners, packet.timestamp, poses.get(qr_codes[0].key))
                 detect_object(self.drone, data)
                 print(f"Transport {self.id}: QR-код распознан: {data}, координаты: {coords}")
                 return {"key": data, "coords": coords}
@@ -409,28 +457,34 @@ class TransportDrone:
             print(f"Transport {self.id}: Ошибка с камерой: {e}")
             return None
 
-    def calculate_coords(self, points):
-        pos = self.drone.position[:3] if self.drone.position is not None else [0, 0, 0]
-        qr_center = np.mean(points, axis=0)
-        shift_x_px = qr_center[0] - self.frame_center[0]
-        shift_y_px = qr_center[1] - self.frame_center[1]
-        shift_x_m = (shift_x_px * pos[2]) / 700
-        shift_y_m = (shift_y_px * pos[2]) / 700
+    def calculate_coords(self, points, timestamp=None, pose=None):
+        # Поза дрона на момент захвата кадра, если она есть в записи телеметрии
+        drone_pose = self.telemetry.pose_at(timestamp) if timestamp is not None else None
+        if drone_pose is not None:
+            pos = drone_pose[:3]
+        else:
+            pos = self.drone.position[:3] if self.drone.position is not None else [0, 0, 0]
+        if pose is not None:
+            # Дальность по размеру кода уточняется высотой из телеметрии
+            pose = fuse_pose_with_altitude(pose, pos[2])
+            shift_x_m, shift_y_m = pose.tvec[0], pose.tvec[1]
+        else:
+            qr_center = np.mean(points, axis=0)
+            shift_x_px = qr_center[0] - self.frame_center[0]
+            shift_y_px = qr_center[1] - self.frame_center[1]
+            shift_x_m = (shift_x_px * pos[2]) / 700
+            shift_y_m = (shift_y_px * pos[2]) / 700
         return [pos[0] + shift_x_m, pos[1] + shift_y_m, pos[2]]
 
     def show_video_stream(self):
         while self.running:
             try:
-                frame = self.camera.get_cv_frame()
+                packet = self.display_frames.get(timeout=self.camera.timeout)
+                frame = packet.image if packet is not None else None
                 if frame is not None:
-                    display_frame = frame
-                    gray = cv2.cvtColor(display_frame, cv2.COLOR_BGR2GRAY)
-                    qr_codes = pyzbar.decode(gray)
-                    for qr_code in qr_codes:
-                        data = qr_code.data.decode("utf-8")
-                        (x, y, w, h) = qr_code.rect
-                        cv2.rectangle(display_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                        cv2.putText(display_frame, data, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                    # Для кадра, уже обработанного detect_qr, берётся готовый результат
+                    detections = self.marker_detector.detect(frame, packet.seq)
+                    display_frame = draw_detections(frame.copy(), detections)  # Кадр общий с детектором
                     cv2.imshow(f"Transport {self.id} Stream", display_frame)
                     if cv2.waitKey(1) == 27:
                         break
@@ -439,6 +493,8 @@ class TransportDrone:
             except Exception as e:
                 print(f"Transport {self.id}: Ошибка с видеопотоком: {e}")
             time.sleep(0.1)
+        self.frame_bus.stop()
+        print(f"Transport {self.id}: фильтр кандидатов детектора меток {self.marker_detector.prefilter.stats()}")
 
     def transport_mission(self):
         if not self.running:
@@ -556,6 +612,12 @@ class TransportRTS:
 # Главная функция
 def main():
     config = CompetitionConfig()
+    # Выбор самого быстрого декодера QR по образцам кадров с кодами (папка qr_samples)
+    samples = load_sample_frames("qr_samples")
+    if samples:
+        decoder, report = calibrate_qr_decoder(samples)
+        set_default_qr_decoder(decoder)
+        print(f"Декодер QR: {decoder.name}, замеры: {report}")
 
     scouts = []
     for i in range(2):